@@ -8,17 +8,107 @@ Usage:
     memory.py get <namespace> <key>
     memory.py delete <namespace> <key>
     memory.py list <namespace>
-    memory.py list-all
+    memory.py list-all [--long]
+    memory.py stats [namespace] [--refresh]
     memory.py clear <namespace>
     memory.py exists <namespace> <key>
-    memory.py keys <namespace> [--pattern=<glob>]
+    memory.py keys <namespace> [<glob>] [--prefix=<p>] [--start=<k>] [--end=<k>]
+    memory.py scan <namespace> [--cursor=<c>] [--count=<n>] [--prefix=<p>] [--pattern=<glob>]
+    memory.py incr <namespace> <key> [delta]
+    memory.py append <namespace> <key> <json>
+    memory.py cas <namespace> <key> <expected|--absent> <new>
+    memory.py patch <namespace> <key> <json-path> <value>
+    memory.py index create|drop <namespace> <json-path>
+    memory.py index list <namespace>
+    memory.py query <namespace> <json-path><op><value>... [--values]   (op: = != < <= > >=)
+    memory.py watch <namespace> [key|pattern] [--timeout=<sec>] [--since=<seq>]
+    memory.py snapshot create <namespace> [--name=<id>]
+    memory.py snapshot list <namespace>
+    memory.py snapshot drop <namespace> <id>
+    memory.py restore <namespace> --at=<snapshot>
+    memory.py export <namespace> [--at=<snapshot>] [--output=<file>]
+    memory.py import <namespace> [--input=<file>] [--replace]
+    memory.py compact [namespace] [--layout=compact|pretty] [--compress=none|zlib|lzma] [--blob-threshold=<bytes>]
+    memory.py serve [--flush-interval=<seconds>]
+
+When a `serve` process is running, the other commands are routed to it over
+a Unix socket instead of reading and writing the JSON files directly.
+Set MEMORY_NO_SERVER=1 to bypass a running server; the server merges such
+writes into its next flush instead of overwriting them.
+
+Python callers can import MemoryStore from this module instead of shelling out.
 """
 
+import base64
+import hashlib
 import json
+import lzma
+import mmap
 import os
+import re
+import shutil
+import signal
+import socket
+import socketserver
 import sys
 import fnmatch
+import threading
+import time
+import zlib
+from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, mutations are unguarded
+    fcntl = None
+
+# Default write-behind interval for `serve`, in seconds (0 = write-through)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# How long the CLI waits to connect to a server before giving up, in seconds
+# (requests themselves wait for as long as the op takes)
+SERVER_TIMEOUT = 5.0
+
+_MISSING = object()
+
+# Value encoding defaults (override with MEMORY_ENCODING / MEMORY_COMPRESSION /
+# MEMORY_BLOB_THRESHOLD or the MemoryStore arguments of the same name)
+DEFAULT_COMPRESSION = "none"
+DEFAULT_BLOB_THRESHOLD = 64 * 1024
+
+# gc_blobs leaves blobs written or reused within this many seconds: a store
+# may still hold unsaved writes (a batch, the server's write-behind cache)
+# that reference them
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Logged hit/miss counts are folded into the catalog on every save, and by
+# any read that leaves the log past this size
+MAX_COUNTER_LOG_BYTES = 64 * 1024
+
+# Event logs are trimmed to their newer half once they grow past this
+MAX_EVENT_LOG_BYTES = 1024 * 1024
+
+# Automatic snapshots (taken before clear/restore/import) kept per namespace
+MAX_AUTO_SNAPSHOTS = 10
+
+# Poll interval bounds for `watch`, in seconds
+WATCH_POLL_MIN = 0.05
+WATCH_POLL_MAX = 0.5
+
+# Values smaller than this are never compressed inline
+COMPRESS_MIN_BYTES = 1024
+
+# Key marking an encoded value: {"$memory": "zlib"|"lzma"|"blob"|"raw", ...}
+VALUE_TAG = "$memory"
+
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
 
 
 def get_project_root() -> Path:
@@ -55,20 +145,25 @@ def sanitize_namespace(namespace: str) -> str:
     return sanitized
 
 
-def get_namespace_file(namespace: str) -> Path:
+def iter_namespace_files(memory_dir: Path) -> list:
+    """Namespace files in a memory directory (dotfiles are internal, not namespaces)."""
+    return sorted(f for f in memory_dir.glob("*.json") if not f.name.startswith("."))
+
+
+def get_namespace_file(namespace: str, memory_dir: Optional[Path] = None) -> Path:
     """Get the JSON file path for a namespace."""
     safe_namespace = sanitize_namespace(namespace)
-    filepath = get_memory_dir() / f"{safe_namespace}.json"
+    memory_dir = memory_dir or get_memory_dir()
+    filepath = memory_dir / f"{safe_namespace}.json"
     # Extra safety: ensure the resolved path is inside the memory directory
-    memory_dir = get_memory_dir()
     if not filepath.resolve().is_relative_to(memory_dir.resolve()):
         raise ValueError(f"Invalid namespace: path traversal detected")
     return filepath
 
 
-def load_namespace(namespace: str) -> dict:
+def load_namespace(namespace: str, memory_dir: Optional[Path] = None) -> dict:
     """Load data from a namespace file."""
-    filepath = get_namespace_file(namespace)
+    filepath = get_namespace_file(namespace, memory_dir)
     if not filepath.exists():
         return {}
     try:
@@ -82,11 +177,864 @@ def load_namespace(namespace: str) -> dict:
         return {}
 
 
-def save_namespace(namespace: str, data: dict) -> None:
-    """Save data to a namespace file."""
-    filepath = get_namespace_file(namespace)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def delete_namespace(namespace: str, memory_dir: Optional[Path] = None) -> None:
+    """Remove a namespace file and its key/field index data (index definitions stay)."""
+    filepath = get_namespace_file(namespace, memory_dir)
+    filepath.unlink(missing_ok=True)
+    get_key_index_file(filepath).unlink(missing_ok=True)
+    get_field_index_files(filepath)[1].unlink(missing_ok=True)
+
+
+def detect_layout(filepath: Path) -> Optional[str]:
+    """Layout of an existing namespace file: "compact", "pretty", or None if absent."""
+    try:
+        with open(filepath, "rb") as f:
+            head = f.read(3)
+    except FileNotFoundError:
+        return None
+    return "compact" if head == b'{\n"' else "pretty"
+
+
+def write_namespace_file(filepath: Path, items: Iterator[tuple], layout: str = "pretty") -> None:
+    """Atomically write (key, stored value) pairs as a namespace file.
+
+    Entries are serialised one at a time, so items may be a generator over
+    data that never sits in memory as a whole. The pretty layout matches
+    json.dump(indent=2) byte for byte.
+    """
+    compact = layout == "compact"
+    tmp_path = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        sep = "{\n" if compact else "{\n  "
+        for key, value in items:
+            if compact:
+                entry = (json.dumps(key, ensure_ascii=False) + ":"
+                         + json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+            else:
+                entry = (json.dumps(key, ensure_ascii=False) + ": "
+                         + json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            f.write(sep + entry)
+            sep = ",\n" if compact else ",\n  "
+        f.write("{}" if sep.startswith("{") else "\n}")
+    os.replace(tmp_path, filepath)
+
+
+def save_namespace(namespace: str, data: dict, memory_dir: Optional[Path] = None,
+                   layout: str = "pretty") -> None:
+    """Save data to a namespace file.
+
+    layout="pretty" is the classic indent=2 JSON. layout="compact" writes one
+    minified entry per line, which is much smaller but keeps top-level keys
+    at line starts for stream_lookup. Writes to a temp file and renames it
+    into place so concurrent readers never see a half-written namespace.
+    """
+    filepath = get_namespace_file(namespace, memory_dir)
+    write_namespace_file(filepath, data.items(), layout)
+    write_key_index(filepath, data)
+
+
+# ---------------------------------------------------------------------------
+# Value encoding and blob storage
+#
+# Values are kept in the namespace file as plain JSON unless they are big:
+# above the blob threshold they move to content-addressed files under
+# .blobs/ (deduplicated, and only read when that key is fetched); above
+# COMPRESS_MIN_BYTES they may be compressed inline. Encoded values are tagged
+# objects, e.g. {"$memory": "blob", "sha256": "...", "codec": "zlib", "size": 123}.
+# A user dict that happens to contain "$memory" is wrapped as "raw".
+# ---------------------------------------------------------------------------
+
+def get_blob_file(memory_dir: Path, sha256: str, codec: str) -> Path:
+    """Path of a content-addressed blob."""
+    return memory_dir / ".blobs" / sha256[:2] / f"{sha256}.{codec}"
+
+
+def _compress(codec: str, raw: bytes) -> bytes:
+    return raw if codec == "none" else CODECS[codec][0](raw)
+
+
+def _decompress(codec: str, packed: bytes) -> bytes:
+    return packed if codec == "none" else CODECS[codec][1](packed)
+
+
+def encode_value(value, memory_dir: Path, compression: str = DEFAULT_COMPRESSION,
+                 blob_threshold: int = DEFAULT_BLOB_THRESHOLD):
+    """Return the form of value to store in a namespace file, writing a blob if needed."""
+    if compression != "none" and compression not in CODECS:
+        raise ValueError(f"Unknown compression: {compression}")
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if blob_threshold and len(raw) >= blob_threshold:
+        sha256 = hashlib.sha256(raw).hexdigest()
+        blob_path = get_blob_file(memory_dir, sha256, compression)
+        try:
+            os.utime(blob_path)  # reused: restart its gc grace period
+        except FileNotFoundError:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_name(f".{blob_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(_compress(compression, raw))
+            os.replace(tmp_path, blob_path)
+        return {VALUE_TAG: "blob", "sha256": sha256, "codec": compression, "size": len(raw)}
+    if compression != "none" and len(raw) >= COMPRESS_MIN_BYTES:
+        packed = base64.b64encode(_compress(compression, raw)).decode("ascii")
+        if len(packed) < len(raw):
+            return {VALUE_TAG: compression, "data": packed}
+    if isinstance(value, dict) and VALUE_TAG in value:
+        return {VALUE_TAG: "raw", "value": value}
+    return value
+
+
+def decode_value(stored, memory_dir: Path):
+    """Inverse of encode_value: resolve tagged values, reading blobs as needed."""
+    if not (isinstance(stored, dict) and VALUE_TAG in stored):
+        return stored
+    kind = stored[VALUE_TAG]
+    if kind == "raw":
+        return stored["value"]
+    if kind == "blob":
+        blob_path = get_blob_file(memory_dir, stored["sha256"], stored["codec"])
+        return json.loads(_decompress(stored["codec"], blob_path.read_bytes()))
+    if kind in CODECS:
+        return json.loads(_decompress(kind, base64.b64decode(stored["data"])))
+    raise ValueError(f"Unknown value encoding: {kind}")
+
+
+def iter_blob_refs(values: Iterable) -> Iterator[tuple]:
+    """(sha256, codec) of every blob referenced by some stored values."""
+    for stored in values:
+        if isinstance(stored, dict) and stored.get(VALUE_TAG) == "blob":
+            yield stored["sha256"], stored["codec"]
+
+
+# ---------------------------------------------------------------------------
+# Sorted key index
+#
+# Each namespace file <ns>.json has a companion .index/<ns>.keys holding one
+# JSON-encoded key per line in sorted order, after a header line recording the
+# mtime/size of the namespace file it was built from. Prefix and range scans
+# binary-search this file instead of parsing and sorting the whole namespace.
+# ---------------------------------------------------------------------------
+
+def get_key_index_file(filepath: Path) -> Path:
+    """Key index path for a namespace file."""
+    return filepath.parent / ".index" / f"{filepath.stem}.keys"
+
+
+def _file_stamp(filepath: Path) -> Optional[dict]:
+    try:
+        st = filepath.stat()
+    except FileNotFoundError:
+        return None
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def write_key_index(filepath: Path, keys: Iterable[str]) -> None:
+    """Rebuild the sorted key index for a freshly written namespace file."""
+    index_path = get_key_index_file(filepath)
+    index_path.parent.mkdir(exist_ok=True)
+    tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(_file_stamp(filepath)) + "\n")
+        for key in sorted(keys):
+            f.write(json.dumps(key, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, index_path)
+
+
+def ensure_key_index(filepath: Path) -> Optional[Path]:
+    """Return an up-to-date key index path, rebuilding it if the namespace changed.
+
+    Returns None if the namespace file does not exist.
+    """
+    stamp = _file_stamp(filepath)
+    if stamp is None:
+        return None
+    index_path = get_key_index_file(filepath)
+    try:
+        with open(index_path, "rb") as f:
+            if json.loads(f.readline()) == stamp:
+                return index_path
+    except (OSError, ValueError):
+        pass
+    with open(filepath, "r", encoding="utf-8") as f:
+        write_key_index(filepath, json.load(f))
+    return index_path
+
+
+def count_index_keys(filepath: Path) -> Optional[int]:
+    """Number of keys per the key index, or None if the index is missing or stale."""
+    try:
+        with open(get_key_index_file(filepath), "rb") as f:
+            if json.loads(f.readline()) != _file_stamp(filepath):
+                return None
+            return sum(1 for _ in f)
+    except (OSError, ValueError):
+        return None
+
+
+def _index_lower_bound(f, key: str, after: bool) -> int:
+    """Offset of the first index line whose key is >= key (> key if after)."""
+    def before(line_key):
+        return line_key <= key if after else line_key < key
+
+    f.seek(0)
+    f.readline()  # header
+    lo = f.tell()
+    f.seek(0, os.SEEK_END)
+    hi = f.tell()
+    # Bisect on byte offsets, resyncing to line starts, until the window is small
+    while lo < hi:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()
+        pos = f.tell()
+        if pos >= hi:
+            break
+        if before(json.loads(f.readline())):
+            lo = f.tell()
+        else:
+            hi = pos
+    f.seek(lo)
+    while f.tell() < hi:
+        pos = f.tell()
+        if not before(json.loads(f.readline())):
+            return pos
+    return hi
+
+
+def iter_index_keys(index_path: Path, lower: Optional[str] = None,
+                    after: bool = False) -> Iterator[str]:
+    """Yield keys from an index file in order, starting at lower (exclusive if after)."""
+    with open(index_path, "rb") as f:
+        if lower is None:
+            f.readline()
+        else:
+            f.seek(_index_lower_bound(f, lower, after))
+        for line in f:
+            yield json.loads(line)
+
+
+def glob_prefix(pattern: str) -> str:
+    """Literal prefix of a glob pattern (the part before the first wildcard)."""
+    for i, ch in enumerate(pattern):
+        if ch in "*?[":
+            return pattern[:i]
+    return pattern
+
+
+def select_keys(sorted_keys: Iterator[str], prefix: Optional[str] = None,
+                end: Optional[str] = None, pattern: Optional[str] = None) -> Iterator[str]:
+    """Filter an ordered key stream that already starts at the range's lower bound.
+
+    Stops at the first key past the prefix or end bound.
+    """
+    for key in sorted_keys:
+        if prefix and not key.startswith(prefix):
+            return
+        if end is not None and key >= end:
+            return
+        if pattern is None or fnmatch.fnmatchcase(key, pattern):
+            yield key
+
+
+# ---------------------------------------------------------------------------
+# Streaming point lookups
+#
+# Fetching one key from a large namespace should not cost a full json.load.
+# The scanner below walks the top-level object of the (memory-mapped) file,
+# skipping the values of non-matching keys with regexes instead of building
+# Python objects, and decodes only the value it stops at.
+# ---------------------------------------------------------------------------
+
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STRING_RE = re.compile(_STRING, re.DOTALL)
+_OPEN_RE = re.compile(rb"\s*\{\s*")
+_ENTRY_RE = re.compile(rb"(" + _STRING + rb")\s*:\s*", re.DOTALL)
+_SEPARATOR_RE = re.compile(rb"\s*([,}])\s*")
+_STRUCTURAL_RE = re.compile(rb'["{}\[\]]')
+_SCALAR_RE = re.compile(rb"[^,}\]\s]*")
+
+
+def _skip_value(buf, pos: int) -> int:
+    """Return the offset just past the JSON value starting at pos."""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _STRING_RE.match(buf, pos).end()
+    if first not in (b"{", b"["):
+        return _SCALAR_RE.match(buf, pos).end()
+    depth = 0
+    while True:
+        m = _STRUCTURAL_RE.search(buf, pos)
+        if m is None:
+            raise ValueError("unterminated JSON container")
+        if m.group() == b'"':
+            pos = _STRING_RE.match(buf, m.start()).end()
+            continue
+        pos = m.end()
+        depth += 1 if m.group() in (b"{", b"[") else -1
+        if depth == 0:
+            return pos
+
+
+def _scan_for_key(buf, key: str, decode: bool):
+    """Find key in a buffer holding one JSON object; _MISSING if absent."""
+    target = json.dumps(key, ensure_ascii=False).encode("utf-8")
+
+    def found(pos):
+        end = _skip_value(buf, pos)
+        return json.loads(bytes(buf[pos:end]).decode("utf-8")) if decode else True
+
+    # Files written by save_namespace (pretty) put every top-level key at
+    # the start of a line after exactly two spaces; nested keys are indented
+    # further and strings cannot hold raw newlines, so a find() hit is exact.
+    # The compact layout does the same with one entry per line and no indent.
+    needle = None
+    if buf[:5] == b'{\n  "':
+        needle = b"\n  " + target + b": "
+    elif buf[:3] == b'{\n"':
+        needle = b"\n" + target + b":"
+    if needle is not None:
+        idx = buf.find(needle)
+        if idx >= 0:
+            return found(idx + len(needle))
+    # A miss proves nothing: another writer may escape the key ("\u00e9",
+    # "a\/b") or space the colon differently. Check every entry's raw key.
+    for raw_key, start, _ in _iter_entries(buf):
+        if raw_key == target or (b"\\" in raw_key and json.loads(raw_key) == key):
+            return found(start)
+    return _MISSING
+
+
+def _iter_entries(buf) -> Iterator[tuple]:
+    """Yield (raw key bytes, value start, value end) for each top-level entry."""
+    m = _OPEN_RE.match(buf)
+    if m is None:
+        raise ValueError("namespace file is not a JSON object")
+    pos = m.end()
+    if buf[pos:pos + 1] == b"}":
+        return
+    while True:
+        m = _ENTRY_RE.match(buf, pos)
+        if m is None:
+            raise ValueError(f"expected key at offset {pos}")
+        end = _skip_value(buf, m.end())
+        yield m.group(1), m.end(), end
+        m = _SEPARATOR_RE.match(buf, end)
+        if m is None:
+            raise ValueError(f"expected ',' or '}}' at offset {end}")
+        if m.group(1) == b"}":
+            return
+        pos = m.end()
+
+
+def stream_lookup(filepath: Path, key: str, decode: bool = True):
+    """Look up one key in a namespace file without parsing the whole file.
+
+    Returns the decoded value (True if decode=False), or _MISSING if the key
+    or the file is absent. The file is memory-mapped when possible and read
+    into memory otherwise. Raises ValueError on malformed JSON.
+    """
+    try:
+        f = open(filepath, "rb")
+    except FileNotFoundError:
+        return _MISSING
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("namespace file is empty")
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return _scan_for_key(f.read(), key, decode)
+        with buf:
+            return _scan_for_key(buf, key, decode)
+
+
+def iter_namespace_entries(filepath: Path) -> Iterator[tuple]:
+    """Yield (key, stored value) for every entry of a namespace file, in file order.
+
+    Values are decoded one at a time from a memory-mapped file, so walking a
+    large namespace costs one entry of memory rather than the whole dict.
+    """
+    with open(filepath, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            buf = f.read()
+        try:
+            for raw_key, start, end in _iter_entries(buf):
+                yield json.loads(raw_key), json.loads(bytes(buf[start:end]).decode("utf-8"))
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+
+# ---------------------------------------------------------------------------
+# JSON paths: $.a.b[0], a.b.0, $["key with spaces"]
+# ---------------------------------------------------------------------------
+
+_PATH_TOKEN_RE = re.compile(r'\.([^.\[\]]+)|\[(-?\d+)\]|\[("(?:[^"\\]|\\.)*")\]')
+
+
+def parse_json_path(path: str) -> list:
+    """Split a JSON path into a list of dict keys (str) and list indexes (int)."""
+    rest = path[1:] if path.startswith("$") else path
+    if rest and not rest.startswith((".", "[")):
+        rest = "." + rest
+    parts = []
+    pos = 0
+    while pos < len(rest):
+        m = _PATH_TOKEN_RE.match(rest, pos)
+        if m is None:
+            raise ValueError(f"Invalid JSON path: {path}")
+        name, index, quoted = m.groups()
+        if name is not None:
+            parts.append(name)
+        elif index is not None:
+            parts.append(int(index))
+        else:
+            parts.append(json.loads(quoted))
+        pos = m.end()
+    return parts
+
+
+def format_json_path(parts: list) -> str:
+    """Canonical spelling of a parsed JSON path, e.g. $.a["b c"][0]."""
+    out = "$"
+    for part in parts:
+        if isinstance(part, int):
+            out += f"[{part}]"
+        elif re.fullmatch(r"[^.\[\]\"]+", part) and not part.lstrip("-").isdigit():
+            out += f".{part}"
+        else:
+            out += f"[{json.dumps(part, ensure_ascii=False)}]"
+    return out
+
+
+def get_json_path(value, parts: list):
+    """Value at parts inside value, or _MISSING if any step is absent."""
+    for part in parts:
+        if isinstance(value, dict):
+            value = value.get(str(part), _MISSING)
+        elif isinstance(value, list):
+            try:
+                value = value[int(part)]
+            except (ValueError, IndexError):
+                return _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _list_index(node: list, part, path: str) -> int:
+    try:
+        return int(part)
+    except ValueError:
+        raise ValueError(f"{path}: {part!r} is not a list index") from None
+
+
+def set_json_path(root, parts: list, value, path: str = "$"):
+    """Set value at parts inside root, creating objects as needed; returns the new root."""
+    if not parts:
+        return value
+    if root is _MISSING or root is None:
+        root = [] if isinstance(parts[0], int) else {}
+    node = root
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if isinstance(node, list):
+            index = _list_index(node, part, path)
+            if last and index == len(node):
+                node.append(value)
+            elif not -len(node) <= index < len(node):
+                raise ValueError(f"{path}: list index {index} out of range")
+            elif last:
+                node[index] = value
+            else:
+                node = node[index]
+        elif isinstance(node, dict):
+            part = str(part)
+            if last:
+                node[part] = value
+            else:
+                if node.get(part) is None:
+                    node[part] = [] if isinstance(parts[i + 1], int) else {}
+                node = node[part]
+        else:
+            raise ValueError(f"{path}: cannot descend into {type(node).__name__}")
+    return root
+
+
+# ---------------------------------------------------------------------------
+# Secondary (field) indexes
+#
+# `index create <ns> <path>` registers a JSON path in .index/<ns>.fields; the
+# store then keeps a sorted (value, key) list per path, updated on every
+# write, and persists it to .index/<ns>.values alongside the namespace file's
+# stamp. Queries bisect that list instead of decoding every value.
+# ---------------------------------------------------------------------------
+
+QUERY_OPS = ("==", "!=", "<=", ">=", "=", "<", ">")
+
+_QUERY_RE = re.compile(r"^(.+?)(==|!=|<=|>=|=|<|>)(.*)$", re.DOTALL)
+
+
+class _Top:
+    """Sorts after every string (upper bound for bisecting (sort_key, key) pairs)."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+_TOP = _Top()
+
+
+def _sort_key(value) -> tuple:
+    """Total order across JSON types: null < bool < number < string < array/object."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True, ensure_ascii=False))
+
+
+def get_field_index_files(filepath: Path) -> tuple:
+    """(registry, values) paths for a namespace file's field indexes."""
+    index_dir = filepath.parent / ".index"
+    return index_dir / f"{filepath.stem}.fields", index_dir / f"{filepath.stem}.values"
+
+
+def read_index_registry(filepath: Path) -> list:
+    """Canonical JSON paths indexed for a namespace."""
+    registry_path, _ = get_field_index_files(filepath)
+    try:
+        return json.loads(registry_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+
+
+def parse_condition(condition: str) -> tuple:
+    """Split 'path<op>value' into (canonical path, op, parsed value)."""
+    m = _QUERY_RE.match(condition)
+    if m is None:
+        raise ValueError(f"Invalid condition (expected <path><op><value>): {condition}")
+    path, op, value = m.groups()
+    op = "==" if op == "=" else op
+    return format_json_path(parse_json_path(path.strip())), op, parse_value(value.strip())
+
+
+class FieldIndex:
+    """Sorted (sort_key, key) entries for one JSON path of a namespace."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parts = parse_json_path(path)
+        self.by_key: dict[str, tuple] = {}
+        self.entries: list = []
+
+    @classmethod
+    def build(cls, path: str, items) -> "FieldIndex":
+        """Index (key, decoded value) pairs."""
+        index = cls(path)
+        for key, value in items:
+            field = get_json_path(value, index.parts)
+            if field is not _MISSING:
+                index.by_key[key] = _sort_key(field)
+        index.entries = sorted((sk, key) for key, sk in index.by_key.items())
+        return index
+
+    @classmethod
+    def from_rows(cls, path: str, rows: list) -> "FieldIndex":
+        """Restore from the persisted [rank, value, key] rows."""
+        index = cls(path)
+        index.entries = [((rank, value), key) for rank, value, key in rows]
+        index.by_key = {key: sk for sk, key in index.entries}
+        return index
+
+    def to_rows(self) -> list:
+        return [[sk[0], sk[1], key] for sk, key in self.entries]
+
+    def remove(self, key: str) -> None:
+        sk = self.by_key.pop(key, None)
+        if sk is not None:
+            del self.entries[bisect_left(self.entries, (sk, key))]
+
+    def add(self, key: str, value) -> None:
+        self.remove(key)
+        field = get_json_path(value, self.parts)
+        if field is not _MISSING:
+            sk = _sort_key(field)
+            self.by_key[key] = sk
+            insort(self.entries, (sk, key))
+
+    def query(self, op: str, value) -> list:
+        """Keys whose field compares to value with op (range ops stay within one JSON type)."""
+        sk = _sort_key(value)
+        entries = self.entries
+        lo_eq = bisect_left(entries, (sk,))
+        hi_eq = bisect_right(entries, (sk, _TOP))
+        if op == "==":
+            hits = entries[lo_eq:hi_eq]
+        elif op == "!=":
+            hits = entries[:lo_eq] + entries[hi_eq:]
+        else:
+            lo_type = bisect_left(entries, ((sk[0],),))
+            hi_type = bisect_left(entries, ((sk[0] + 1,),))
+            hits = {
+                "<": entries[lo_type:lo_eq],
+                "<=": entries[lo_type:hi_eq],
+                ">": entries[hi_eq:hi_type],
+                ">=": entries[lo_eq:hi_type],
+            }[op]
+        return sorted(key for _, key in hits)
+
+
+def _field_matches(field, op: str, value) -> bool:
+    """Unindexed fallback with the same semantics as FieldIndex.query."""
+    if field is _MISSING:
+        return False
+    a, b = _sort_key(field), _sort_key(value)
+    if op == "==":
+        return a == b
+    if op == "!=":
+        return a != b
+    if a[0] != b[0]:
+        return False
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+# ---------------------------------------------------------------------------
+# Catalog: per-namespace metadata in .catalog.json, maintained on every save,
+# so capacity questions never require loading namespace data.
+# ---------------------------------------------------------------------------
+
+def get_catalog_file(memory_dir: Path) -> Path:
+    """Path of the namespace catalog."""
+    return memory_dir / ".catalog.json"
+
+
+def read_catalog(memory_dir: Path) -> dict:
+    """Catalog entries by namespace: keys, bytes, mtime_ns, hits, misses."""
+    try:
+        return json.loads(get_catalog_file(memory_dir).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def update_catalog(memory_dir: Path, fn: Callable[[dict], None]) -> None:
+    """Apply fn to the catalog in place and save it, under the catalog lock."""
+    lock_path = memory_dir / ".locks" / ".catalog.lock"
+    lock_path.parent.mkdir(exist_ok=True)
+    with open(lock_path, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        catalog = read_catalog(memory_dir)
+        fn(catalog)
+        catalog_path = get_catalog_file(memory_dir)
+        tmp_path = catalog_path.with_name(f".{catalog_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(catalog, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, catalog_path)
+
+
+def get_counter_log_file(memory_dir: Path) -> Path:
+    """Path of the log hit/miss counts are appended to between catalog merges."""
+    return memory_dir / ".counters.log"
+
+
+def append_counters(memory_dir: Path, counters: dict) -> None:
+    """Append {namespace: [hits, misses]} to the counter log without taking the catalog lock.
+
+    An append that leaves the log past MAX_COUNTER_LOG_BYTES merges it, so
+    read-only workloads don't grow it without bound.
+    """
+    line = json.dumps({sanitize_namespace(ns): pair for ns, pair in counters.items()}) + "\n"
+    fd = os.open(get_counter_log_file(memory_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))  # one O_APPEND write, so concurrent lines don't interleave
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size >= MAX_COUNTER_LOG_BYTES:
+        merge_counters(memory_dir)
+
+
+def fold_counter_log(memory_dir: Path, catalog: dict) -> None:
+    """Add the counter log to the catalog's hits/misses and start a new log; caller holds the catalog lock."""
+    log_path = get_counter_log_file(memory_dir)
+    merging = log_path.with_name(f"{log_path.name}.{os.getpid()}.merging")
+    try:
+        os.replace(log_path, merging)
+    except FileNotFoundError:
+        return  # nothing logged (or merged by another process while we waited for the lock)
+    with open(merging, encoding="utf-8") as f:
+        for line in f:
+            try:
+                counters = json.loads(line)
+            except ValueError:
+                continue
+            for namespace, (hits, misses) in counters.items():
+                entry = catalog.setdefault(namespace, {})
+                entry["hits"] = entry.get("hits", 0) + hits
+                entry["misses"] = entry.get("misses", 0) + misses
+    merging.unlink()
+
+
+def merge_counters(memory_dir: Path) -> None:
+    """Fold the counter log into the catalog."""
+    if get_counter_log_file(memory_dir).exists():
+        update_catalog(memory_dir, lambda catalog: fold_counter_log(memory_dir, catalog))
+
+
+def describe_namespaces(memory_dir: Path) -> list:
+    """One row per namespace file from the catalog plus a stat() of each file.
+
+    Rows whose catalog entry does not match the file (hand edits, files
+    written before the catalog existed) have keys=None until refreshed.
+    """
+    catalog = read_catalog(memory_dir)
+    rows = []
+    for filepath in iter_namespace_files(memory_dir):
+        st = filepath.stat()
+        entry = catalog.get(filepath.stem, {})
+        current = entry.get("mtime_ns") == st.st_mtime_ns and entry.get("bytes") == st.st_size
+        rows.append({
+            "namespace": filepath.stem,
+            "keys": entry.get("keys") if current else None,
+            "bytes": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hits": entry.get("hits", 0),
+            "misses": entry.get("misses", 0),
+        })
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Change events: every save appends {"seq", "keys"} (or {"seq", "clear"}, or
+# {"seq", "reset"} after a restore/import) to .events/<ns>.log, so watchers
+# can stat one small file and read only the new tail instead of reparsing
+# the namespace.
+# ---------------------------------------------------------------------------
+
+def get_event_log_file(filepath: Path) -> Path:
+    """Event log path for a namespace file."""
+    return filepath.parent / ".events" / f"{filepath.stem}.log"
+
+
+def read_last_seq(log_path: Path) -> int:
+    """Sequence number of the newest complete event (0 if none).
+
+    Reads backwards from the end in growing windows until one holds a whole
+    line, so an event listing many keys is never mistaken for a partial one.
+    """
+    try:
+        f = open(log_path, "rb")
+    except FileNotFoundError:
+        return 0
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        window = 4096
+        while True:
+            start = max(0, end - window)
+            f.seek(start)
+            lines = f.read(end - start).split(b"\n")
+            # The last piece follows the final newline (empty, or an event still
+            # being written); the first may be cut off unless the window is the whole file
+            for line in reversed(lines[1 if start else 0:-1]):
+                try:
+                    return json.loads(line)["seq"]
+                except (ValueError, KeyError):
+                    continue
+            if not start:
+                return 0
+            window *= 4
+
+
+def append_event(log_path: Path, event: dict) -> int:
+    """Append an event with the next sequence number; caller holds the namespace lock."""
+    log_path.parent.mkdir(exist_ok=True)
+    event = {"seq": read_last_seq(log_path) + 1, **event}
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    if log_path.stat().st_size > MAX_EVENT_LOG_BYTES:
+        lines = log_path.read_bytes().splitlines(keepends=True)
+        tmp_path = log_path.with_name(f".{log_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(b"".join(lines[len(lines) // 2:]))
+        os.replace(tmp_path, log_path)
+    return event["seq"]
+
+
+def read_events(log_path: Path, since: int) -> tuple:
+    """Events with seq > since, and whether older ones were trimmed away."""
+    try:
+        lines = log_path.read_bytes().split(b"\n")
+    except FileNotFoundError:
+        return [], False
+    # Skip the piece after the final newline: an event another process is still appending
+    events = [json.loads(line) for line in lines[:-1] if line.strip()]
+    trimmed = bool(events) and events[0]["seq"] > since + 1
+    return [e for e in events if e["seq"] > since], trimmed
+
+
+# ---------------------------------------------------------------------------
+# Snapshots: .snapshots/<ns>/<id>.json is a hard link to the namespace file as
+# it was. Saves always write a new file and rename it over the old one, so a
+# linked file is never modified afterwards and taking or restoring a snapshot
+# copies no data. The key and field indexes are linked alongside it, and
+# <id>.meta (written last) records when it was taken and the event seq.
+# Blobs are immutable and gc_blobs keeps any that a snapshot references.
+# ---------------------------------------------------------------------------
+
+def get_snapshot_dir(filepath: Path) -> Path:
+    """Snapshot directory for a namespace file."""
+    return filepath.parent / ".snapshots" / filepath.stem
+
+
+def check_snapshot_id(snapshot_id: str) -> str:
+    """Validate a snapshot name (it becomes part of a file name)."""
+    if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]*", snapshot_id or ""):
+        raise ValueError(f"Invalid snapshot name: {snapshot_id!r}")
+    return snapshot_id
+
+
+def snapshot_files(filepath: Path, snapshot_id: str) -> list:
+    """(snapshot file, live file) pairs of a snapshot, namespace file last."""
+    snapshot_dir = get_snapshot_dir(filepath)
+    return [
+        (snapshot_dir / f"{snapshot_id}.keys", get_key_index_file(filepath)),
+        (snapshot_dir / f"{snapshot_id}.values", get_field_index_files(filepath)[1]),
+        (snapshot_dir / f"{snapshot_id}.json", filepath),
+    ]
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Atomically make dst a hard link to src, or a copy (mtime kept) where links fail."""
+    if dst.exists() and os.path.samefile(src, dst):
+        return  # already linked; rename() between two links to one file is a no-op
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def read_snapshots(filepath: Path) -> list:
+    """Metadata of a namespace's snapshots, oldest first."""
+    rows = []
+    for meta_path in get_snapshot_dir(filepath).glob("*.meta"):
+        try:
+            rows.append(json.loads(meta_path.read_text(encoding="utf-8")))
+        except ValueError:
+            continue
+    return sorted(rows, key=lambda row: row["created"])
 
 
 def parse_value(value_str: str):
@@ -97,22 +1045,1319 @@ def parse_value(value_str: str):
         return value_str
 
 
+class OpError(Exception):
+    """A memory operation failed in a way the caller should report."""
+
+
+class MissingError(OpError):
+    """The namespace, key, snapshot or index an operation named does not exist."""
+
+
+class MemoryStore:
+    """Importable key-value store over the namespace files in data/memory/.
+
+    Loaded namespaces are cached in memory and reused until the file's mtime
+    or size changes, so repeated reads in one process skip the JSON parse.
+
+        store = MemoryStore()
+        store.set("bug-tracker", "current", "BUG-42")
+        store.get("bug-tracker", "current")          # -> "BUG-42"
+
+        with store:                                   # one save per namespace on exit
+            for i, result in enumerate(results):
+                store.set("cache", f"result-{i}", result)
+
+        with store.transaction("counters") as data:   # read-modify-write
+            data["runs"] = data.get("runs", 0) + 1
+
+    With write_behind=True (used by `serve`) mutations are only persisted by
+    flush(). With stream_lookups=True, get/exists on a namespace that is not
+    already cached scan the file for that one key instead of loading it (best
+    for one-shot callers like the CLI). The store is not thread-safe; guard it
+    with a lock if shared.
+
+    If a `serve` process is running for the same memory dir, reads and writes
+    are sent to it over its socket rather than racing its write-behind cache
+    (use_server=False, or MEMORY_NO_SERVER=1, to go to the files anyway).
+    transaction() and update() with a callable cannot be sent, so they raise
+    OpError while a server is up.
+
+    encoding ("pretty"/"compact") forces a file layout; by default each
+    namespace keeps the layout it already has. compression ("none"/"zlib"/
+    "lzma") and blob_threshold (bytes, 0 = off) apply to values as they are
+    written; see encode_value().
+    """
+
+    def __init__(self, memory_dir: Optional[Path] = None, write_behind: bool = False,
+                 stream_lookups: bool = False, encoding: Optional[str] = None,
+                 compression: Optional[str] = None, blob_threshold: Optional[int] = None,
+                 use_server: bool = True):
+        self.memory_dir = Path(memory_dir) if memory_dir else get_memory_dir()
+        self.write_behind = write_behind
+        self.use_server = use_server
+        self._server: Optional[socket.socket] = None
+        self.stream_lookups = stream_lookups
+        self.encoding = encoding or os.environ.get("MEMORY_ENCODING") or None
+        self.compression = compression or os.environ.get("MEMORY_COMPRESSION", DEFAULT_COMPRESSION)
+        if blob_threshold is None:
+            blob_threshold = int(os.environ.get("MEMORY_BLOB_THRESHOLD", DEFAULT_BLOB_THRESHOLD))
+        self.blob_threshold = blob_threshold
+        self._layouts: dict[str, str] = {}
+        self._registries: dict[str, list] = {}
+        self._field_indexes: dict[str, dict] = {}
+        self._counters: dict[str, list] = {}
+        self._pending_keys: dict[str, set] = {}
+        self._data: dict[str, dict] = {}
+        self._stamps: dict[str, Optional[tuple]] = {}
+        self._sorted: dict[str, list] = {}
+        self._dirty: set[str] = set()
+        self._batch_depth = 0
+        self._locks: dict[str, list] = {}
+
+    # -- context manager: batch writes ------------------------------------
+
+    def __enter__(self) -> "MemoryStore":
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+        if exc_type is not None:
+            # Abandon the batch: forget unsaved changes so they reload from disk
+            for namespace in self._dirty:
+                self._forget(namespace)
+            self._dirty.clear()
+        elif not self.write_behind:
+            self.flush()
+
+    # -- cache management --------------------------------------------------
+
+    def _path(self, namespace: str) -> Path:
+        return get_namespace_file(namespace, self.memory_dir)
+
+    def _stamp(self, namespace: str) -> Optional[tuple]:
+        try:
+            st = self._path(namespace).stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _forget(self, namespace: str) -> None:
+        self._data.pop(namespace, None)
+        self._stamps.pop(namespace, None)
+        self._sorted.pop(namespace, None)
+        self._registries.pop(namespace, None)
+        self._field_indexes.pop(namespace, None)
+        self._pending_keys.pop(namespace, None)
+
+    def _is_current(self, namespace: str) -> bool:
+        """Whether the cached copy of a namespace can be used as-is."""
+        if namespace in self._dirty:
+            return True
+        return namespace in self._data and self._stamps.get(namespace) == self._stamp(namespace)
+
+    def _load(self, namespace: str) -> dict:
+        """Return the cached namespace dict, reloading it if the file changed."""
+        if not self._is_current(namespace):
+            self._forget(namespace)
+            self._data[namespace] = load_namespace(namespace, self.memory_dir)
+            self._stamps[namespace] = self._stamp(namespace)
+            layout = detect_layout(self._path(namespace))
+            if layout:
+                self._layouts[namespace] = layout
+        return self._data[namespace]
+
+    def _encode(self, value):
+        return encode_value(value, self.memory_dir, self.compression, self.blob_threshold)
+
+    def _decode(self, stored):
+        return decode_value(stored, self.memory_dir)
+
+    def _sorted_keys(self, namespace: str) -> list:
+        """Sorted key list for a cached namespace, kept in step with set/delete."""
+        if namespace not in self._sorted:
+            self._sorted[namespace] = sorted(self._load(namespace))
+        return self._sorted[namespace]
+
+    def _ordered_keys(self, namespace: str, lower: Optional[str], after: bool) -> Iterator[str]:
+        """Keys in order from lower, from the cache if loaded, else the on-disk index."""
+        if self._is_current(namespace):
+            keys = self._sorted_keys(namespace)
+            if lower is None:
+                start = 0
+            else:
+                start = (bisect_right if after else bisect_left)(keys, lower)
+            return iter(keys[start:])
+        index_path = ensure_key_index(self._path(namespace))
+        if index_path is None:
+            return iter(())
+        return iter_index_keys(index_path, lower, after)
+
+    def _changed(self, namespace: str, durable: bool = False) -> None:
+        """Persist a mutated namespace now, or defer it to flush().
+
+        durable=True saves immediately even inside a batch (but not in
+        write-behind mode, where this process is the only writer).
+        """
+        self._dirty.add(namespace)
+        if not self.write_behind and (durable or not self._batch_depth):
+            self._save(namespace)
+
+    def _rebase(self, namespace: str) -> None:
+        """Reapply this store's unsaved changes on top of the namespace file.
+
+        Used when another process rewrote the file after it was loaded here
+        (a write-behind server, or a batch, racing a direct writer): keys
+        changed here win, every other key takes the file's current value.
+        """
+        ours = self._data[namespace]
+        merged = load_namespace(namespace, self.memory_dir)
+        for key in self._pending_keys.get(namespace, ()):
+            if key in ours:
+                merged[key] = ours[key]
+            else:
+                merged.pop(key, None)
+        self._data[namespace] = merged
+        self._sorted.pop(namespace, None)
+        self._registries.pop(namespace, None)
+        paths = self._registry(namespace)
+        decoded = [(k, self._decode(v)) for k, v in merged.items()] if paths else []
+        self._field_indexes[namespace] = {path: FieldIndex.build(path, decoded) for path in paths}
+        layout = detect_layout(self._path(namespace))
+        if layout:
+            self._layouts[namespace] = layout
+
+    def _save(self, namespace: str, layout: Optional[str] = None) -> None:
+        self._dirty.discard(namespace)
+        with self.locked(namespace):
+            if self._stamps.get(namespace) != self._stamp(namespace):
+                self._rebase(namespace)
+            layout = layout or self.encoding or self._layouts.get(namespace, "pretty")
+            indexes = self._indexes_for(namespace)
+            save_namespace(namespace, self._data[namespace], self.memory_dir, layout)
+            self._stamps[namespace] = self._stamp(namespace)
+            if indexes:
+                self._write_field_indexes(namespace, indexes)
+            changed = self._pending_keys.pop(namespace, None)
+            if changed:
+                append_event(self._event_log(namespace), {"keys": sorted(changed)})
+            self._sync_catalog(namespace)
+
+    def _sync_catalog(self, saved: Optional[str] = None, keys: Optional[int] = None) -> None:
+        """Record a saved namespace's size/key count and any pending hit/miss counts.
+
+        keys defaults to the cached namespace's length; pass it for files
+        written without loading them (None there means unknown). Counts with
+        nothing saved go to the counter log, so a read never waits on the
+        catalog lock; saves and stats() fold the log back in.
+        """
+        counters, self._counters = self._counters, {}
+        if saved is None:
+            if counters:
+                append_counters(self.memory_dir, counters)
+            return
+        st = self._path(saved).stat()
+        if saved in self._data:
+            keys = len(self._data[saved])
+        file_entry = {"keys": keys, "bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+        def apply(catalog):
+            catalog.setdefault(saved, {}).update(file_entry)
+            fold_counter_log(self.memory_dir, catalog)
+            for namespace, (hits, misses) in counters.items():
+                entry = catalog.setdefault(sanitize_namespace(namespace), {})
+                entry["hits"] = entry.get("hits", 0) + hits
+                entry["misses"] = entry.get("misses", 0) + misses
+
+        update_catalog(self.memory_dir, apply)
+
+    # -- change events -------------------------------------------------------
+
+    def _event_log(self, namespace: str) -> Path:
+        return get_event_log_file(self._path(namespace))
+
+    def change_seq(self, namespace: str) -> int:
+        """Current change sequence number of a namespace (0 if never changed)."""
+        return read_last_seq(self._event_log(namespace))
+
+    def watch(self, namespace: str, pattern: Optional[str] = None, since: Optional[int] = None,
+              timeout: Optional[float] = None) -> Optional[dict]:
+        """Block until a key matching pattern changes after sequence number since.
+
+        since defaults to the current sequence number (i.e. wait for the next
+        change). Waiting is a stat() poll of the event log with backoff.
+        Returns {"seq", "keys", "cleared", "reset", "trimmed"} or None on
+        timeout; keys lists every matching key changed between since and seq.
+        reset means the namespace was restored or imported, so any key may
+        have changed.
+        """
+        self.flush()
+        log_path = self._event_log(namespace)
+        if since is None:
+            since = read_last_seq(log_path)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        last_stamp = _MISSING
+        delay = WATCH_POLL_MIN
+        while True:
+            stamp = _file_stamp(log_path)
+            if stamp != last_stamp:
+                last_stamp = stamp
+                events, trimmed = read_events(log_path, since)
+                keys, cleared, reset = set(), False, False
+                for event in events:
+                    cleared = cleared or event.get("clear", False)
+                    reset = reset or "reset" in event
+                    keys.update(k for k in event.get("keys", [])
+                                if pattern is None or fnmatch.fnmatchcase(k, pattern))
+                if keys or cleared or reset or (trimmed and events):
+                    return {"seq": events[-1]["seq"], "keys": sorted(keys),
+                            "cleared": cleared, "reset": reset, "trimmed": trimmed}
+                if events:
+                    since = events[-1]["seq"]
+                delay = WATCH_POLL_MIN
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            pause = delay if deadline is None else min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(pause)
+            delay = min(delay * 2, WATCH_POLL_MAX)
+
+    # -- field indexes -------------------------------------------------------
+
+    def _registry(self, namespace: str) -> list:
+        if namespace not in self._registries:
+            self._registries[namespace] = read_index_registry(self._path(namespace))
+        return self._registries[namespace]
+
+    def _read_field_indexes(self, namespace: str) -> dict:
+        """Persisted indexes, if they were built from the current namespace file."""
+        _, values_path = get_field_index_files(self._path(namespace))
+        try:
+            saved = json.loads(values_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+        if saved.get("stamp") != _file_stamp(self._path(namespace)):
+            return {}
+        return {path: FieldIndex.from_rows(path, rows) for path, rows in saved["indexes"].items()}
+
+    def _write_field_indexes(self, namespace: str, indexes: dict) -> None:
+        _, values_path = get_field_index_files(self._path(namespace))
+        values_path.parent.mkdir(exist_ok=True)
+        payload = {
+            "stamp": _file_stamp(self._path(namespace)),
+            "indexes": {path: index.to_rows() for path, index in indexes.items()},
+        }
+        tmp_path = values_path.with_name(f".{values_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, values_path)
+
+    def _indexes_for(self, namespace: str) -> dict:
+        """In-memory field indexes for a loaded namespace, built or read on first use."""
+        paths = self._registry(namespace)
+        if not paths:
+            return {}
+        indexes = self._field_indexes.setdefault(namespace, {})
+        missing = [path for path in paths if path not in indexes]
+        if missing:
+            data = self._load(namespace)
+            saved = {} if namespace in self._dirty else self._read_field_indexes(namespace)
+            decoded = None
+            for path in missing:
+                if path in saved:
+                    indexes[path] = saved[path]
+                    continue
+                if decoded is None:
+                    decoded = [(k, self._decode(v)) for k, v in data.items()]
+                indexes[path] = FieldIndex.build(path, decoded)
+        return indexes
+
+    def create_index(self, namespace: str, path: str) -> str:
+        """Start indexing a JSON path of a namespace's values; returns the canonical path."""
+        remote = self._remote("index-create", namespace, path=path)
+        if remote is not _MISSING:
+            return remote
+        path = format_json_path(parse_json_path(path))
+        with self.locked(namespace):
+            paths = read_index_registry(self._path(namespace))
+            if path not in paths:
+                paths = sorted(paths + [path])
+                registry_path, _ = get_field_index_files(self._path(namespace))
+                registry_path.parent.mkdir(exist_ok=True)
+                registry_path.write_text(json.dumps(paths, ensure_ascii=False), encoding="utf-8")
+            self._registries[namespace] = paths
+            indexes = self._indexes_for(namespace)
+            if self.has_namespace(namespace) and namespace not in self._dirty:
+                self._write_field_indexes(namespace, indexes)
+        return path
+
+    def drop_index(self, namespace: str, path: str) -> bool:
+        """Stop indexing a JSON path. Returns False if it was not indexed."""
+        remote = self._remote("index-drop", namespace, missing=False, path=path)
+        if remote is not _MISSING:
+            return remote is None
+        path = format_json_path(parse_json_path(path))
+        with self.locked(namespace):
+            paths = read_index_registry(self._path(namespace))
+            if path not in paths:
+                return False
+            paths.remove(path)
+            registry_path, values_path = get_field_index_files(self._path(namespace))
+            if paths:
+                registry_path.write_text(json.dumps(paths, ensure_ascii=False), encoding="utf-8")
+            else:
+                registry_path.unlink(missing_ok=True)
+            self._registries[namespace] = paths
+            self._field_indexes.get(namespace, {}).pop(path, None)
+            if paths and self.has_namespace(namespace) and namespace not in self._dirty:
+                self._write_field_indexes(namespace, self._indexes_for(namespace))
+            else:
+                values_path.unlink(missing_ok=True)
+            return True
+
+    def list_indexes(self, namespace: str) -> list:
+        """Indexed JSON paths of a namespace."""
+        return list(read_index_registry(self._path(namespace)))
+
+    def query(self, namespace: str, conditions: list) -> list:
+        """Keys whose values satisfy every (path, op, value) condition.
+
+        Indexed paths are answered from the persisted index without loading
+        the namespace when it is up to date; other paths fall back to a scan.
+        """
+        remote = self._remote("query", namespace, missing=[], conditions=[list(c) for c in conditions])
+        if remote is not _MISSING:
+            return remote
+        paths = self._registry(namespace)
+        saved = {}
+        if not self._is_current(namespace) and all(path in paths for path, _, _ in conditions):
+            saved = self._read_field_indexes(namespace)
+        result = None
+        for path, op, value in conditions:
+            if op not in QUERY_OPS:
+                raise ValueError(f"Unknown query operator: {op}")
+            op = "==" if op == "=" else op
+            path = format_json_path(parse_json_path(path))
+            if path in saved:
+                keys = saved[path].query(op, value)
+            elif path in paths:
+                keys = self._indexes_for(namespace)[path].query(op, value)
+            else:
+                parts = parse_json_path(path)
+                keys = [k for k, v in self.iter(namespace)
+                        if _field_matches(get_json_path(v, parts), op, value)]
+            if result is None:
+                result = keys
+            else:
+                matched = set(keys)
+                result = [k for k in result if k in matched]
+        return result or []
+
+    def flush(self) -> int:
+        """Write every dirty namespace (and pending stats) to disk. Returns how many were written."""
+        dirty = sorted(self._dirty)
+        for namespace in dirty:
+            self._save(namespace)
+        self._sync_catalog()
+        return len(dirty)
+
+    # -- running server -----------------------------------------------------
+
+    def _connection(self) -> Optional[socket.socket]:
+        """Socket to a running server for this memory dir, or None."""
+        if self.use_server and self._server is None:
+            self._server = connect_server(self.memory_dir)
+        return self._server
+
+    def _remote(self, op: str, namespace: Optional[str] = None, missing=_MISSING, **fields):
+        """Run an op on the running server; _MISSING if there is none.
+
+        A MissingError on the server returns missing, or raises KeyError if
+        no missing value is given.
+        """
+        payload = encode_request({"op": op, "namespace": namespace, **fields})
+        sock = self._connection()
+        if sock is None:
+            return _MISSING
+        try:
+            sock.sendall(payload)
+        except OSError:
+            # The server went away (or restarted) before taking the request, so
+            # nothing ran: reconnect and send it once more, else use the files
+            sock.close()
+            self._server = None
+            sock = self._connection()
+            if sock is None:
+                return _MISSING
+            sock.sendall(payload)
+        try:
+            response = read_response(sock)
+        except OpError:
+            # The op may have run; resending it could apply an incr/append twice
+            sock.close()
+            self._server = None
+            raise
+        if response.get("ok"):
+            return response.get("result")
+        if response.get("missing"):
+            if missing is _MISSING:
+                raise KeyError(fields.get("key", namespace))
+            return missing
+        raise OpError(response.get("error", "unknown server error"))
+
+    @contextmanager
+    def locked(self, namespace: str) -> Iterator[None]:
+        """Hold a namespace's inter-process lock (re-entrant within this store).
+
+        Uses flock on .locks/<ns>.lock; a no-op where fcntl is unavailable.
+        OpError if a running server holds the namespace: only ops that can be
+        sent to it are allowed then.
+        """
+        held = self._locks.get(namespace)
+        if held is None and self._connection() is not None:
+            raise OpError(f"{namespace}: a memory server is running; use set/cas/incr/append/patch "
+                          "(sent to the server) or set MEMORY_NO_SERVER=1")
+        if held is not None:
+            held[1] += 1
+        elif fcntl is not None:
+            lock_path = self.memory_dir / ".locks" / f"{self._path(namespace).stem}.lock"
+            lock_path.parent.mkdir(exist_ok=True)
+            handle = open(lock_path, "a")
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            self._locks[namespace] = held = [handle, 1]
+        try:
+            yield
+        finally:
+            if held is not None:
+                held[1] -= 1
+                if not held[1]:
+                    del self._locks[namespace]
+                    held[0].close()  # releases the flock
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Drop clean cached namespaces so the next access rereads the file."""
+        for ns in [namespace] if namespace else list(self._data):
+            if ns not in self._dirty:
+                self._forget(ns)
+
+    # -- public API ----------------------------------------------------------
+
+    def has_namespace(self, namespace: str) -> bool:
+        """Whether the namespace exists on disk or is pending a flush."""
+        names = self._remote("list-all")
+        if names is not _MISSING:
+            return sanitize_namespace(namespace) in names
+        return namespace in self._dirty or self._path(namespace).exists()
+
+    def namespaces(self) -> list:
+        """All namespace names, on disk or pending a flush."""
+        remote = self._remote("list-all")
+        if remote is not _MISSING:
+            return remote
+        names = {f.stem for f in iter_namespace_files(self.memory_dir)}
+        return sorted(names | self._dirty)
+
+    def stats(self, namespace: Optional[str] = None, refresh: bool = False) -> list:
+        """Catalog rows (see describe_namespaces) for one or all namespaces.
+
+        Pending writes are flushed and logged hit/miss counts merged into the
+        catalog first. refresh=True loads any namespace whose catalog entry is
+        stale and re-records it.
+        """
+        rows = self._remote("stats", namespace, refresh=refresh)
+        if rows is not _MISSING:
+            return rows
+        self.flush()
+        merge_counters(self.memory_dir)
+        rows = describe_namespaces(self.memory_dir)
+        if namespace is not None:
+            name = sanitize_namespace(namespace)
+            rows = [row for row in rows if row["namespace"] == name]
+        if refresh:
+            for row in rows:
+                if row["keys"] is None:
+                    row["keys"] = len(self._load(row["namespace"]))
+                    self._sync_catalog(row["namespace"])
+        return rows
+
+    def _lookup(self, namespace: str, key: str, decode: bool = True):
+        """Single-key read: streamed from the file if uncached, else from the cache."""
+        stored = _MISSING
+        if self.stream_lookups and not self._is_current(namespace):
+            try:
+                stored = stream_lookup(self._path(namespace), key, decode)
+            except ValueError:
+                stored = self._load(namespace).get(key, _MISSING)  # full load reports/backs up
+        else:
+            stored = self._load(namespace).get(key, _MISSING)
+        counter = self._counters.setdefault(sanitize_namespace(namespace), [0, 0])
+        counter[stored is _MISSING] += 1
+        if stored is _MISSING or not decode:
+            return stored if stored is _MISSING else True
+        return self._decode(stored)
+
+    def get(self, namespace: str, key: str, default=_MISSING):
+        """Return a value, or default (KeyError if no default given)."""
+        value = self._remote("get", namespace, key=key, missing=default)
+        if value is not _MISSING:
+            return value
+        value = self._lookup(namespace, key)
+        if value is not _MISSING:
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def _put(self, namespace: str, key: str, stored, value) -> None:
+        """Write an encoded value (and its decoded form for field indexes)."""
+        data = self._load(namespace)
+        for index in self._indexes_for(namespace).values():
+            index.add(key, value)
+        if key not in data and namespace in self._sorted:
+            insort(self._sorted[namespace], key)
+        data[key] = stored
+        self._pending_keys.setdefault(namespace, set()).add(key)
+
+    def set(self, namespace: str, key: str, value) -> None:
+        """Store a JSON-serialisable value."""
+        if self._remote("store", namespace, key=key, value=value) is not _MISSING:
+            return
+        stored = self._encode(value)
+        with self.locked(namespace):
+            self._put(namespace, key, stored, value)
+            self._changed(namespace)
+
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove a key (KeyError if missing)."""
+        if self._remote("delete", namespace, key=key) is not _MISSING:
+            return
+        with self.locked(namespace):
+            data = self._load(namespace)
+            if key not in data:
+                raise KeyError(key)
+            for index in self._indexes_for(namespace).values():
+                index.remove(key)
+            del data[key]
+            self._pending_keys.setdefault(namespace, set()).add(key)
+            if namespace in self._sorted:
+                keys = self._sorted[namespace]
+                del keys[bisect_left(keys, key)]
+            self._changed(namespace)
+
+    def exists(self, namespace: str, key: str) -> bool:
+        """Whether a key is present."""
+        found = self._remote("exists", namespace, key=key)
+        if found is not _MISSING:
+            return found
+        return self._lookup(namespace, key, decode=False) is not _MISSING
+
+    def keys(self, namespace: str, pattern: Optional[str] = None, prefix: Optional[str] = None,
+             start: Optional[str] = None, end: Optional[str] = None) -> list:
+        """Sorted keys, optionally limited to a prefix, a [start, end) range or a glob.
+
+        A glob's literal prefix is used to narrow the scan, so only keys in
+        that range are pattern-matched.
+        """
+        remote = self._remote("keys", namespace, missing=[], pattern=pattern, prefix=prefix, start=start, end=end)
+        if remote is not _MISSING:
+            return remote
+        if pattern:
+            literal = glob_prefix(pattern)
+            if len(literal) > len(prefix or "") and literal.startswith(prefix or ""):
+                prefix = literal
+        lower = max(filter(None, (prefix, start)), default=None)
+        ordered = self._ordered_keys(namespace, lower, after=False)
+        return list(select_keys(ordered, prefix, end, pattern))
+
+    def scan(self, namespace: str, cursor: Optional[str] = None, count: int = 100,
+             prefix: Optional[str] = None, pattern: Optional[str] = None) -> tuple:
+        """Page through keys in order, examining at most count keys per call.
+
+        Returns (next_cursor, keys). Pass next_cursor back in to continue;
+        it is None once the scan is complete. Memory use is bounded by count.
+        """
+        page = self._remote("scan", namespace, missing={"cursor": None, "keys": []}, cursor=cursor,
+                            count=count, prefix=prefix, pattern=pattern)
+        if page is not _MISSING:
+            return page["cursor"], page["keys"]
+        after = cursor is not None
+        lower = cursor if after else prefix
+        if after and prefix and cursor < prefix:
+            lower, after = prefix, False
+        keys = []
+        last = None
+        examined = 0
+        for key in self._ordered_keys(namespace, lower, after):
+            if prefix and not key.startswith(prefix):
+                break
+            if examined == count:
+                return last, keys
+            examined += 1
+            last = key
+            if pattern is None or fnmatch.fnmatchcase(key, pattern):
+                keys.append(key)
+        return None, keys
+
+    def iter(self, namespace: str, pattern: Optional[str] = None) -> Iterator[tuple]:
+        """Yield (key, value) pairs in key order."""
+        self._remote("flush")  # a running server's writes must be on disk before the file is read
+        data = self._load(namespace)
+        for key in self.keys(namespace, pattern):
+            yield key, self._decode(data[key])
+
+    def clear(self, namespace: str) -> Optional[str]:
+        """Delete a namespace and its file.
+
+        The old contents are kept as a "pre-clear" snapshot; returns its id
+        (None if the namespace did not exist) for restore().
+        """
+        backup = self._remote("clear", namespace, missing=None)
+        if backup is not _MISSING:
+            return backup
+        with self.locked(namespace):
+            backup = self.snapshot(namespace, auto="pre-clear") if self.has_namespace(namespace) else None
+            self._forget(namespace)
+            self._dirty.discard(namespace)
+            self._counters.pop(namespace, None)
+            delete_namespace(namespace, self.memory_dir)
+            append_event(self._event_log(namespace), {"clear": True})
+            name = sanitize_namespace(namespace)
+            update_catalog(self.memory_dir, lambda catalog: catalog.pop(name, None))
+            self._prune_auto_snapshots(namespace)
+        return backup
+
+    @contextmanager
+    def transaction(self, namespace: str) -> Iterator[dict]:
+        """Yield a working copy of a namespace, committed if the block succeeds.
+
+        The namespace lock is held for the whole block and the result is saved
+        before it is released, so concurrent writers cannot interleave.
+        Rollback covers top-level keys only; values mutated in place are shared
+        with the cache.
+        """
+        with self.locked(namespace):
+            before = self._load(namespace)
+            working = {k: self._decode(v) for k, v in before.items()}
+            yield working
+            after = {k: self._encode(v) for k, v in working.items()}
+            changed = {k for k in before.keys() | after.keys() if before.get(k, _MISSING) != after.get(k, _MISSING)}
+            self._pending_keys.setdefault(namespace, set()).update(changed)
+            self._data[namespace] = after
+            self._sorted.pop(namespace, None)
+            self._field_indexes[namespace] = {
+                path: FieldIndex.build(path, working.items()) for path in self._registry(namespace)
+            }
+            self._changed(namespace, durable=True)
+
+    # -- atomic read-modify-write ------------------------------------------
+
+    def update(self, namespace: str, key: str, fn: Callable) -> object:
+        """Atomically replace a key's value with fn(current) and return the new value.
+
+        current is _MISSING if the key is absent. Runs under the namespace lock
+        against the latest file contents and saves before releasing it.
+        """
+        with self.locked(namespace):
+            current = self._load(namespace).get(key, _MISSING)
+            new_value = fn(current if current is _MISSING else self._decode(current))
+            self._put(namespace, key, self._encode(new_value), new_value)
+            self._changed(namespace, durable=True)
+            return new_value
+
+    def incr(self, namespace: str, key: str, delta=1):
+        """Add delta to a numeric value (missing counts as 0); returns the new value."""
+        remote = self._remote("incr", namespace, key=key, delta=delta)
+        if remote is not _MISSING:
+            return remote
+
+        def add(current):
+            if current is _MISSING:
+                current = 0
+            if isinstance(current, bool) or not isinstance(current, (int, float)):
+                raise ValueError(f'Value of "{key}" is not a number')
+            return current + delta
+        return self.update(namespace, key, add)
+
+    def append(self, namespace: str, key: str, item) -> int:
+        """Append item to a list value (missing starts a new list); returns the new length."""
+        remote = self._remote("append", namespace, key=key, value=item)
+        if remote is not _MISSING:
+            return remote
+
+        def push(current):
+            if current is _MISSING:
+                current = []
+            if not isinstance(current, list):
+                raise ValueError(f'Value of "{key}" is not a list')
+            current.append(item)
+            return current
+        return len(self.update(namespace, key, push))
+
+    def cas(self, namespace: str, key: str, expected, new) -> bool:
+        """Set key to new only if its value equals expected (_MISSING = must be absent)."""
+        remote = self._remote("cas", namespace, key=key, value=new, absent=expected is _MISSING,
+                              expected=None if expected is _MISSING else expected)
+        if remote is not _MISSING:
+            return remote
+        with self.locked(namespace):
+            current = self._load(namespace).get(key, _MISSING)
+            if (current if current is _MISSING else self._decode(current)) != expected:
+                return False
+            self._put(namespace, key, self._encode(new), new)
+            self._changed(namespace, durable=True)
+            return True
+
+    def patch(self, namespace: str, key: str, path: str, value):
+        """Set value at a JSON path inside a key's value; returns the updated value."""
+        remote = self._remote("patch", namespace, key=key, path=path, value=value)
+        if remote is not _MISSING:
+            return remote
+        parts = parse_json_path(path)
+        return self.update(namespace, key, lambda current: set_json_path(current, parts, value, path))
+
+    # -- snapshots, export and import ----------------------------------------
+
+    def snapshot(self, namespace: str, name: Optional[str] = None, auto: Optional[str] = None) -> str:
+        """Snapshot a namespace as it is now and return the snapshot id.
+
+        Costs a few hard links whatever the namespace's size. The id is name,
+        or a timestamp (prefixed with auto for the automatic snapshots taken
+        before clear/restore/import, which are pruned to MAX_AUTO_SNAPSHOTS).
+        KeyError if the namespace does not exist.
+        """
+        if auto is None:
+            remote = self._remote("snapshot-create", namespace, name=name)
+            if remote is not _MISSING:
+                return remote
+        with self.locked(namespace):
+            if namespace in self._dirty:
+                self._save(namespace)
+            filepath = self._path(namespace)
+            if not filepath.exists():
+                raise KeyError(namespace)
+            snapshot_dir = get_snapshot_dir(filepath)
+            if name is None:
+                base = datetime.now().strftime("%Y%m%d-%H%M%S")
+                snapshot_id = f"{auto}-{base}" if auto else base
+                n = 1
+                while (snapshot_dir / f"{snapshot_id}.meta").exists():
+                    n += 1
+                    snapshot_id = f"{auto}-{base}-{n}" if auto else f"{base}-{n}"
+            else:
+                snapshot_id = check_snapshot_id(name)
+                if (snapshot_dir / f"{snapshot_id}.meta").exists():
+                    raise ValueError(f'Snapshot "{snapshot_id}" of {namespace} already exists')
+            keys = count_index_keys(filepath)
+            key_index_path = get_key_index_file(filepath)
+            for snapshot_path, live_path in snapshot_files(filepath, snapshot_id):
+                if live_path == key_index_path and keys is None:
+                    continue  # stale: rebuilt from the namespace file after a restore
+                if live_path.exists():
+                    link_or_copy(live_path, snapshot_path)
+            meta = {
+                "id": snapshot_id,
+                "created": time.time(),
+                "seq": self.change_seq(namespace),
+                "keys": keys,
+                "bytes": filepath.stat().st_size,
+                "auto": auto is not None,
+            }
+            meta_path = snapshot_dir / f"{snapshot_id}.meta"
+            tmp_path = meta_path.with_name(f".{meta_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_path, meta_path)
+        return snapshot_id
+
+    def list_snapshots(self, namespace: str) -> list:
+        """Snapshot metadata ({"id", "created", "seq", "keys", "bytes", "auto"}), oldest first."""
+        return read_snapshots(self._path(namespace))
+
+    def drop_snapshot(self, namespace: str, snapshot_id: str) -> bool:
+        """Delete a snapshot. Returns False if there was no such snapshot."""
+        filepath = self._path(namespace)
+        meta_path = get_snapshot_dir(filepath) / f"{check_snapshot_id(snapshot_id)}.meta"
+        if not meta_path.exists():
+            return False
+        meta_path.unlink()
+        for snapshot_path, _ in snapshot_files(filepath, snapshot_id):
+            snapshot_path.unlink(missing_ok=True)
+        return True
+
+    def _prune_auto_snapshots(self, namespace: str) -> None:
+        automatic = [row for row in self.list_snapshots(namespace) if row.get("auto")]
+        for row in automatic[:-MAX_AUTO_SNAPSHOTS]:
+            self.drop_snapshot(namespace, row["id"])
+
+    def restore(self, namespace: str, snapshot_id: str) -> Optional[str]:
+        """Roll a namespace back to a snapshot (KeyError if there is no such snapshot).
+
+        The snapshot's files are linked back into place, so nothing is parsed
+        and its key/field indexes stay valid. The replaced state is kept as a
+        "pre-restore" snapshot whose id is returned (None if the namespace
+        did not exist).
+        """
+        try:
+            backup = self._remote("restore", namespace, name=snapshot_id)
+        except KeyError:
+            raise KeyError(snapshot_id) from None
+        if backup is not _MISSING:
+            return backup
+        filepath = self._path(namespace)
+        meta_path = get_snapshot_dir(filepath) / f"{check_snapshot_id(snapshot_id)}.meta"
+        with self.locked(namespace):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                raise KeyError(snapshot_id) from None
+            backup = self.snapshot(namespace, auto="pre-restore") if self.has_namespace(namespace) else None
+            for snapshot_path, live_path in snapshot_files(filepath, snapshot_id):
+                if snapshot_path.exists():
+                    link_or_copy(snapshot_path, live_path)
+                else:
+                    live_path.unlink(missing_ok=True)
+            self._forget(namespace)
+            append_event(self._event_log(namespace), {"reset": "restore", "snapshot": snapshot_id})
+            self._sync_catalog(namespace, keys=meta.get("keys"))
+            self._prune_auto_snapshots(namespace)
+        return backup
+
+    def export_ndjson(self, namespace: str, out, snapshot_id: Optional[str] = None) -> int:
+        """Write a namespace (or one of its snapshots) to a text stream as NDJSON.
+
+        Each line is {"key": ..., "value": ...} with the value decoded. Entries
+        are streamed from the file in file order, one value in memory at a
+        time. Returns the number of keys written; KeyError if there is no such
+        namespace or snapshot.
+        """
+        self._remote("flush")  # a running server's writes must be on disk before the file is read
+        if snapshot_id is None:
+            if namespace in self._dirty:
+                self._save(namespace)
+            filepath = self._path(namespace)
+        else:
+            filepath = get_snapshot_dir(self._path(namespace)) / f"{check_snapshot_id(snapshot_id)}.json"
+        if not filepath.exists():
+            raise KeyError(snapshot_id or namespace)
+        count = 0
+        for key, stored in iter_namespace_entries(filepath):
+            out.write(json.dumps({"key": key, "value": self._decode(stored)}, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def import_ndjson(self, namespace: str, path: Path, replace: bool = False) -> int:
+        """Load NDJSON lines as written by export_ndjson into a namespace.
+
+        Imported keys overwrite existing ones (the last line wins for a key
+        that repeats); replace=True drops keys missing from the input. The new
+        file is streamed from the old one and the input, so memory grows with
+        the number of keys but not with their values. The previous state is
+        kept as a "pre-import" snapshot. Returns the number of keys imported.
+        """
+        path = Path(path)
+        remote = self._remote("import", namespace, path=str(path.resolve()), replace=replace)
+        if remote is not _MISSING:
+            return remote
+        latest = {}
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    valid = isinstance(record, dict) and isinstance(record.get("key"), str) and "value" in record
+                except ValueError:
+                    valid = False
+                if not valid:
+                    raise ValueError(f'import line {lineno}: expected {{"key": <string>, "value": <json>}}')
+                latest[record["key"]] = lineno
+
+        filepath = self._path(namespace)
+        with self.locked(namespace):
+            if self.has_namespace(namespace):
+                self.snapshot(namespace, auto="pre-import")
+            layout = self.encoding or detect_layout(filepath) or "pretty"
+            keys = []
+
+            def entries():
+                if not replace and filepath.exists():
+                    for key, stored in iter_namespace_entries(filepath):
+                        if key not in latest:
+                            keys.append(key)
+                            yield key, stored
+                with open(path, encoding="utf-8") as f:
+                    for lineno, line in enumerate(f, 1):
+                        if line.strip():
+                            record = json.loads(line)
+                            if latest[record["key"]] == lineno:
+                                keys.append(record["key"])
+                                yield record["key"], self._encode(record["value"])
+
+            write_namespace_file(filepath, entries(), layout)
+            write_key_index(filepath, keys)
+            get_field_index_files(filepath)[1].unlink(missing_ok=True)  # rebuilt on next query
+            self._forget(namespace)
+            self._layouts[namespace] = layout
+            append_event(self._event_log(namespace), {"reset": "import"})
+            self._sync_catalog(namespace, keys=len(keys))
+            self._prune_auto_snapshots(namespace)
+        return len(latest)
+
+    # -- maintenance ---------------------------------------------------------
+
+    def compact(self, namespace: str, layout: str = "compact", compression: Optional[str] = None,
+                blob_threshold: Optional[int] = None) -> tuple:
+        """Rewrite a namespace in the given layout, re-encoding every value.
+
+        Large values move to blobs and compression applies retroactively
+        (compression/blob_threshold default to this store's settings). The
+        layout sticks for later writes. Returns (bytes_before, bytes_after).
+        """
+        remote = self._remote("compact", namespace, layout=layout, compression=compression,
+                              blob_threshold=blob_threshold)
+        if remote is not _MISSING:
+            return tuple(remote)
+        compression = compression or self.compression
+        if blob_threshold is None:
+            blob_threshold = self.blob_threshold
+        filepath = self._path(namespace)
+        with self.locked(namespace):
+            before = filepath.stat().st_size
+            self._data[namespace] = {
+                k: encode_value(self._decode(v), self.memory_dir, compression, blob_threshold)
+                for k, v in self._load(namespace).items()
+            }
+            self._layouts[namespace] = layout
+            self._save(namespace, layout)
+            return before, filepath.stat().st_size
+
+    def gc_blobs(self) -> tuple:
+        """Delete blob files no namespace or snapshot references. Returns (files, bytes) removed.
+
+        This store's pending writes are flushed first; blobs touched within
+        BLOB_GC_GRACE_SECONDS are kept, since other stores may not have saved
+        the writes that reference them yet.
+        """
+        remote = self._remote("gc-blobs")
+        if remote is not _MISSING:
+            return tuple(remote)
+        self.flush()
+        referenced, seen = set(), set()
+        snapshots = sorted((self.memory_dir / ".snapshots").glob("*/*.json"))
+        for filepath in iter_namespace_files(self.memory_dir) + snapshots:
+            st = filepath.stat()
+            if (st.st_dev, st.st_ino) in seen:
+                continue  # a snapshot still linked to the live file
+            seen.add((st.st_dev, st.st_ino))
+            stored_values = (stored for _, stored in iter_namespace_entries(filepath))
+            for sha256, codec in iter_blob_refs(stored_values):
+                referenced.add(get_blob_file(self.memory_dir, sha256, codec))
+        removed = freed = 0
+        cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+        for blob_path in (self.memory_dir / ".blobs").glob("*/*"):
+            if blob_path in referenced:
+                continue
+            try:
+                st = blob_path.stat()
+            except FileNotFoundError:
+                continue  # a temp file renamed into place meanwhile
+            if st.st_mtime < cutoff:
+                blob_path.unlink(missing_ok=True)
+                freed += st.st_size
+                removed += 1
+        return removed, freed
+
+
+def run_op(store: MemoryStore, request: dict):
+    """Execute one protocol request against a store and return its result."""
+    op = request.get("op")
+    namespace = request.get("namespace")
+    key = request.get("key")
+
+    if op == "list-all":
+        return store.namespaces()
+    if op == "stats":
+        return store.stats(namespace, bool(request.get("refresh")))
+    if op == "gc-blobs":
+        return store.gc_blobs()
+    if op == "flush":
+        return store.flush()
+    if not isinstance(namespace, str):
+        raise OpError(f"{op}: namespace is required")
+
+    if op == "store":
+        store.set(namespace, key, request.get("value"))
+        return None
+
+    if op in ("get", "delete"):
+        try:
+            return store.get(namespace, key) if op == "get" else store.delete(namespace, key)
+        except KeyError:
+            raise MissingError(f'Key "{key}" not found in {namespace}') from None
+
+    if op == "exists":
+        return store.exists(namespace, key)
+
+    if op == "index-create":
+        return store.create_index(namespace, request["path"])
+
+    if op == "index-drop":
+        if not store.drop_index(namespace, request["path"]):
+            raise MissingError(f'No index on {request["path"]} in {namespace}')
+        return None
+
+    if op == "index-list":
+        return store.list_indexes(namespace)
+
+    if op == "query":
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        conditions = [tuple(c) for c in request.get("conditions", [])]
+        keys = store.query(namespace, conditions)
+        if request.get("values"):
+            return [[k, store.get(namespace, k)] for k in keys]
+        return keys
+
+    if op == "compact":
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        return store.compact(namespace, request.get("layout", "compact"),
+                             request.get("compression"), request.get("blob_threshold"))
+
+    if op == "incr":
+        return store.incr(namespace, key, request.get("delta", 1))
+
+    if op == "append":
+        return store.append(namespace, key, request.get("value"))
+
+    if op == "cas":
+        expected = _MISSING if request.get("absent") else request.get("expected")
+        return store.cas(namespace, key, expected, request.get("value"))
+
+    if op == "patch":
+        return store.patch(namespace, key, request.get("path", "$"), request.get("value"))
+
+    if op in ("list", "keys"):
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        return store.keys(namespace, request.get("pattern"), request.get("prefix"),
+                          request.get("start"), request.get("end"))
+
+    if op == "scan":
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        next_cursor, keys = store.scan(namespace, request.get("cursor"), int(request.get("count", 100)),
+                                       request.get("prefix"), request.get("pattern"))
+        return {"cursor": next_cursor, "keys": keys}
+
+    if op == "clear":
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        return store.clear(namespace)
+
+    if op == "snapshot-create":
+        if not store.has_namespace(namespace):
+            raise MissingError(f'Namespace "{namespace}" does not exist')
+        return store.snapshot(namespace, request.get("name"))
+
+    if op == "snapshot-list":
+        return store.list_snapshots(namespace)
+
+    if op == "snapshot-drop":
+        if not store.drop_snapshot(namespace, request.get("name")):
+            raise MissingError(f'No snapshot "{request.get("name")}" of {namespace}')
+        return None
+
+    if op == "restore":
+        try:
+            return store.restore(namespace, request.get("name"))
+        except KeyError:
+            raise MissingError(f'No snapshot "{request.get("name")}" of {namespace}') from None
+
+    if op == "import":
+        return store.import_ndjson(namespace, request["path"], bool(request.get("replace")))
+
+    raise OpError(f"Unknown op: {op}")
+
+
+# ---------------------------------------------------------------------------
+# Server mode
+# ---------------------------------------------------------------------------
+
+def get_socket_path(memory_dir: Optional[Path] = None) -> Path:
+    """Socket the memory server listens on (override with MEMORY_SOCKET)."""
+    override = os.environ.get("MEMORY_SOCKET")
+    if override:
+        return Path(override)
+    return (memory_dir or get_memory_dir()) / "memory.sock"
+
+
+class _MemoryRequestHandler(socketserver.StreamRequestHandler):
+    """Serve line-delimited JSON requests until the client disconnects."""
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                response = self.server.handle_line(line)
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away; its op has already run
+
+
+class MemoryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server holding namespaces in a write-behind cache."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path: Path, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.socket_path = socket_path
+        self.flush_interval = flush_interval
+        self.store = MemoryStore(write_behind=flush_interval > 0, use_server=False)
+        self.lock = threading.Lock()
+        super().__init__(str(socket_path), _MemoryRequestHandler)
+
+    def handle_line(self, line: bytes) -> dict:
+        """Decode, execute and wrap a single request line."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise OpError("request must be a JSON object")
+            with self.lock:
+                result = run_op(self.store, request)
+            return {"ok": True, "result": result}
+        except (OpError, ValueError) as e:
+            return {"ok": False, "error": str(e), "missing": isinstance(e, MissingError)}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def flush(self) -> int:
+        """Persist pending writes."""
+        with self.lock:
+            return self.store.flush()
+
+
+def connect_server(memory_dir: Optional[Path] = None) -> Optional[socket.socket]:
+    """Connect to a running memory server, or return None if there isn't one."""
+    if os.environ.get("MEMORY_NO_SERVER") or not hasattr(socket, "AF_UNIX"):
+        return None
+    socket_path = get_socket_path(memory_dir)
+    if not socket_path.exists():
+        return None
+    deadline = time.monotonic() + SERVER_TIMEOUT
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(SERVER_TIMEOUT)
+        try:
+            sock.connect(str(socket_path))
+            # Only connecting is bounded: an op may wait behind a long compact/import
+            sock.settimeout(None)
+            return sock
+        except (ConnectionRefusedError, FileNotFoundError):
+            sock.close()
+            return None  # stale socket: no server behind it
+        except (BlockingIOError, TimeoutError):
+            # Listen backlog full: the server is up, so falling back to the
+            # files would race its write-behind cache. Retry instead.
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise OpError(f"memory server at {socket_path} is not responding")
+            time.sleep(0.01)
+
+
+def encode_request(request: dict) -> bytes:
+    """One protocol line."""
+    return json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def read_response(sock: socket.socket) -> dict:
+    """Read the response to a request already sent.
+
+    OpError if the connection drops first; the op may still have run, so the
+    caller must not resend it.
+    """
+    try:
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    except OSError as e:
+        raise OpError(f"lost the memory server connection before its response (the op may have run): {e}") from None
+    if not line:
+        raise OpError("memory server closed the connection before responding (the op may have run)")
+    return json.loads(line)
+
+
+def remote_call(sock: socket.socket, request: dict) -> dict:
+    """Send one request to the server and return its decoded response."""
+    sock.sendall(encode_request(request))
+    return read_response(sock)
+
+
+def call(request: dict):
+    """Run a request on the server if one is up, otherwise against the files."""
+    sock = connect_server()
+    if sock is None:
+        store = MemoryStore(stream_lookups=True, use_server=False)
+        try:
+            return run_op(store, request)
+        finally:
+            store.flush()  # record hit/miss counters in the catalog
+    with sock:
+        response = remote_call(sock, request)
+    if not response.get("ok"):
+        raise OpError(response.get("error", "unknown server error"))
+    return response.get("result")
+
+
+def cmd_serve(flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> None:
+    """Run the memory server in the foreground until interrupted."""
+    if not hasattr(socket, "AF_UNIX"):
+        print("Error: serve requires Unix domain sockets", file=sys.stderr)
+        sys.exit(1)
+
+    socket_path = get_socket_path()
+    existing = connect_server()
+    if existing is not None:
+        existing.close()
+        print(f"Memory server already running on {socket_path}", file=sys.stderr)
+        sys.exit(1)
+    socket_path.unlink(missing_ok=True)  # stale socket from a crashed server
+
+    server = MemoryServer(socket_path, flush_interval)
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    mode = f"write-behind every {flush_interval}s" if flush_interval > 0 else "write-through"
+    print(f"Memory server listening on {socket_path} ({mode})")
+
+    try:
+        while not stop.wait(flush_interval if flush_interval > 0 else None):
+            server.flush()
+    finally:
+        server.shutdown()
+        server.server_close()
+        written = server.flush()
+        socket_path.unlink(missing_ok=True)
+        print(f"Memory server stopped ({written} namespace(s) flushed)")
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
 def cmd_store(namespace: str, key: str, value: str) -> None:
     """Store a value in a namespace."""
-    data = load_namespace(namespace)
-    data[key] = parse_value(value)
-    save_namespace(namespace, data)
+    call({"op": "store", "namespace": namespace, "key": key, "value": parse_value(value)})
     print(f'Stored "{key}" in {namespace}')
 
 
 def cmd_get(namespace: str, key: str) -> None:
     """Retrieve a value from a namespace."""
-    data = load_namespace(namespace)
-    if key not in data:
-        print(f'Key "{key}" not found in {namespace}', file=sys.stderr)
-        sys.exit(1)
-
-    value = data[key]
+    value = call({"op": "get", "namespace": namespace, "key": key})
     if isinstance(value, (dict, list)):
         print(json.dumps(value, indent=2, ensure_ascii=False))
     else:
@@ -121,85 +2366,301 @@ def cmd_get(namespace: str, key: str) -> None:
 
 def cmd_delete(namespace: str, key: str) -> None:
     """Delete a key from a namespace."""
-    data = load_namespace(namespace)
-    if key not in data:
-        print(f'Key "{key}" not found in {namespace}', file=sys.stderr)
-        sys.exit(1)
-
-    del data[key]
-    save_namespace(namespace, data)
+    call({"op": "delete", "namespace": namespace, "key": key})
     print(f'Deleted "{key}" from {namespace}')
 
 
 def cmd_list(namespace: str) -> None:
     """List all keys in a namespace."""
-    filepath = get_namespace_file(namespace)
-    if not filepath.exists():
-        print(f'Namespace "{namespace}" does not exist', file=sys.stderr)
-        sys.exit(1)
-
-    data = load_namespace(namespace)
-    if not data:
+    keys = call({"op": "list", "namespace": namespace})
+    if not keys:
         print(f"No keys in {namespace}")
         return
 
     print(f"Keys in {namespace}:")
-    for key in sorted(data.keys()):
+    for key in keys:
         print(f"  - {key}")
 
 
-def cmd_list_all() -> None:
-    """List all namespaces."""
-    memory_dir = get_memory_dir()
-    namespaces = sorted([f.stem for f in memory_dir.glob("*.json")])
+def cmd_list_all(long: bool = False) -> None:
+    """List all namespaces (with size, key count and mtime from the catalog if long)."""
+    if not long:
+        namespaces = call({"op": "list-all"})
+        if not namespaces:
+            print("No namespaces found")
+            return
+        print("Namespaces:")
+        for ns in namespaces:
+            print(f"  - {ns}")
+        return
 
-    if not namespaces:
+    rows = call({"op": "stats"})
+    if not rows:
         print("No namespaces found")
         return
+    print(f"{'Namespace':<30} {'Keys':>8} {'Size':>10}  Modified")
+    print("-" * 70)
+    for row in rows:
+        keys = "?" if row["keys"] is None else row["keys"]
+        modified = datetime.fromtimestamp(row["mtime_ns"] / 1e9).strftime("%Y-%m-%d %H:%M")
+        print(f"{row['namespace']:<30} {keys:>8} {format_bytes(row['bytes']):>10}  {modified}")
 
-    print("Namespaces:")
-    for ns in namespaces:
-        print(f"  - {ns}")
+
+def cmd_stats(namespace: Optional[str] = None, refresh: bool = False) -> None:
+    """Show catalog statistics for one namespace or all of them."""
+    rows = call({"op": "stats", "namespace": namespace, "refresh": refresh})
+    if namespace is not None and not rows:
+        raise MissingError(f'Namespace "{namespace}" does not exist')
+
+    for row in sorted(rows, key=lambda r: r["bytes"], reverse=True):
+        lookups = row["hits"] + row["misses"]
+        hit_rate = f"{100 * row['hits'] / lookups:.0f}%" if lookups else "n/a"
+        keys = "? (run stats --refresh)" if row["keys"] is None else row["keys"]
+        modified = datetime.fromtimestamp(row["mtime_ns"] / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{row['namespace']}:")
+        print(f"  keys: {keys}")
+        print(f"  size: {format_bytes(row['bytes'])}")
+        print(f"  modified: {modified}")
+        print(f"  lookups: {lookups} ({row['hits']} hits, {row['misses']} misses, hit rate {hit_rate})")
+
+    if namespace is None:
+        known = [r["keys"] for r in rows if r["keys"] is not None]
+        print(f"\nTotal: {len(rows)} namespace(s), {sum(known)} key(s)"
+              f"{'+' if len(known) < len(rows) else ''}, {format_bytes(sum(r['bytes'] for r in rows))}")
 
 
 def cmd_clear(namespace: str) -> None:
     """Clear all data in a namespace."""
-    filepath = get_namespace_file(namespace)
-    if not filepath.exists():
-        print(f'Namespace "{namespace}" does not exist', file=sys.stderr)
-        sys.exit(1)
-
-    filepath.unlink()
+    backup = call({"op": "clear", "namespace": namespace})
     print(f"Cleared namespace {namespace}")
+    if backup:
+        print(f"  (undo with: memory.py restore {namespace} --at={backup})")
 
 
 def cmd_exists(namespace: str, key: str) -> None:
     """Check if a key exists in a namespace."""
-    data = load_namespace(namespace)
-    if key in data:
+    if call({"op": "exists", "namespace": namespace, "key": key}):
         print("true")
     else:
         print("false")
         sys.exit(1)
 
 
-def cmd_keys(namespace: str, pattern: str = None) -> None:
-    """List keys in a namespace, optionally filtered by glob pattern."""
-    filepath = get_namespace_file(namespace)
-    if not filepath.exists():
-        print(f'Namespace "{namespace}" does not exist', file=sys.stderr)
-        sys.exit(1)
+def cmd_keys(namespace: str, pattern: str = None, prefix: str = None,
+             start: str = None, end: str = None) -> None:
+    """List keys in a namespace, optionally filtered by prefix, range or glob pattern."""
+    request = {"op": "keys", "namespace": namespace, "pattern": pattern,
+               "prefix": prefix, "start": start, "end": end}
+    for key in call(request):
+        print(key)
 
-    data = load_namespace(namespace)
-    keys = sorted(data.keys())
 
-    if pattern:
-        keys = [k for k in keys if fnmatch.fnmatch(k, pattern)]
+def encode_cursor(key: Optional[str]) -> str:
+    """CLI form of a scan cursor: "0" at the start/end, else base64 of the last key."""
+    if key is None:
+        return "0"
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
 
-    for key in keys:
+
+def decode_cursor(cursor: str) -> Optional[str]:
+    """Inverse of encode_cursor."""
+    if cursor in ("", "0"):
+        return None
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded).decode("utf-8")
+
+
+def cmd_scan(namespace: str, cursor: str = "0", count: int = 100,
+             prefix: str = None, pattern: str = None) -> None:
+    """Print the next cursor (0 when finished), then up to count keys."""
+    result = call({"op": "scan", "namespace": namespace, "cursor": decode_cursor(cursor),
+                   "count": count, "prefix": prefix, "pattern": pattern})
+    print(encode_cursor(result["cursor"]))
+    for key in result["keys"]:
         print(key)
 
 
+def cmd_incr(namespace: str, key: str, delta: str = "1") -> None:
+    """Atomically add to a numeric value and print the result."""
+    delta = parse_value(delta)
+    if isinstance(delta, bool) or not isinstance(delta, (int, float)):
+        raise OpError(f"incr: delta must be a number, got {delta!r}")
+    print(call({"op": "incr", "namespace": namespace, "key": key, "delta": delta}))
+
+
+def cmd_append(namespace: str, key: str, value: str) -> None:
+    """Atomically append to a list value and print the new length."""
+    length = call({"op": "append", "namespace": namespace, "key": key, "value": parse_value(value)})
+    print(f'Appended to "{key}" in {namespace} (length {length})')
+
+
+def cmd_cas(namespace: str, key: str, expected: Optional[str], value: str) -> None:
+    """Compare-and-set: print true if the swap happened, else false (exit 1)."""
+    request = {"op": "cas", "namespace": namespace, "key": key, "value": parse_value(value)}
+    if expected is None:
+        request["absent"] = True
+    else:
+        request["expected"] = parse_value(expected)
+    if call(request):
+        print("true")
+    else:
+        print("false")
+        sys.exit(1)
+
+
+def cmd_patch(namespace: str, key: str, path: str, value: str) -> None:
+    """Atomically set a nested field and print the updated value."""
+    result = call({"op": "patch", "namespace": namespace, "key": key,
+                   "path": path, "value": parse_value(value)})
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+def format_bytes(size: int) -> str:
+    """Human-readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def cmd_compact(namespace: Optional[str], layout: str = "compact", compression: str = "zlib",
+                blob_threshold: int = None) -> None:
+    """Re-encode one namespace (or all, then drop unreferenced blobs)."""
+    namespaces = [namespace] if namespace else call({"op": "list-all"})
+    for ns in namespaces:
+        before, after = call({"op": "compact", "namespace": ns, "layout": layout,
+                              "compression": compression, "blob_threshold": blob_threshold})
+        print(f"Compacted {ns}: {format_bytes(before)} -> {format_bytes(after)}")
+    if namespace is None:
+        removed, freed = call({"op": "gc-blobs"})
+        print(f"Removed {removed} unreferenced blob(s), {format_bytes(freed)} freed")
+
+
+def cmd_index(action: str, namespace: str, path: Optional[str] = None) -> None:
+    """Create, drop or list secondary indexes on value fields."""
+    if action == "create":
+        canonical = call({"op": "index-create", "namespace": namespace, "path": path})
+        print(f"Indexed {canonical} in {namespace}")
+    elif action == "drop":
+        call({"op": "index-drop", "namespace": namespace, "path": path})
+        print(f"Dropped index on {path} in {namespace}")
+    else:
+        paths = call({"op": "index-list", "namespace": namespace})
+        if not paths:
+            print(f"No indexes in {namespace}")
+        for indexed in paths:
+            print(indexed)
+
+
+def cmd_query(namespace: str, conditions: list, values: bool = False) -> None:
+    """Print keys (or key and value) matching all conditions."""
+    parsed = [list(parse_condition(c)) for c in conditions]
+    rows = call({"op": "query", "namespace": namespace, "conditions": parsed, "values": values})
+    for row in rows:
+        if values:
+            print(f"{row[0]}\t{json.dumps(row[1], ensure_ascii=False)}")
+        else:
+            print(row)
+
+
+def cmd_watch(namespace: str, pattern: Optional[str] = None, timeout: Optional[float] = None,
+              since: Optional[int] = None) -> None:
+    """Block until a matching key changes, then print the change as JSON (exit 1 on timeout).
+
+    Watching reads the event log directly rather than going through a
+    server, so it never ties up the server's lock; values are fetched
+    through call() so they reflect a running server's latest writes.
+    """
+    change = MemoryStore().watch(namespace, pattern, since, timeout)
+    if change is None:
+        print(f"Timed out waiting for changes in {namespace}", file=sys.stderr)
+        sys.exit(1)
+    values, deleted = {}, []
+    for key in change["keys"]:
+        try:
+            values[key] = call({"op": "get", "namespace": namespace, "key": key})
+        except OpError:
+            deleted.append(key)
+    result = {"seq": change["seq"], "changed": values, "deleted": deleted}
+    if change["cleared"]:
+        result["cleared"] = True
+    if change["reset"]:
+        result["reset"] = True  # restored or imported: re-read everything
+    if change["trimmed"]:
+        result["trimmed"] = True  # events before the log was trimmed were missed
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+def cmd_snapshot(action: str, namespace: str, name: Optional[str] = None) -> None:
+    """Create, drop or list snapshots of a namespace."""
+    if action == "create":
+        snapshot_id = call({"op": "snapshot-create", "namespace": namespace, "name": name})
+        print(f"Snapshot {snapshot_id} of {namespace}")
+    elif action == "drop":
+        call({"op": "snapshot-drop", "namespace": namespace, "name": name})
+        print(f"Dropped snapshot {name} of {namespace}")
+    else:
+        rows = call({"op": "snapshot-list", "namespace": namespace})
+        if not rows:
+            print(f"No snapshots of {namespace}")
+            return
+        print(f"{'Snapshot':<36} {'Keys':>8} {'Size':>10}  Taken")
+        print("-" * 76)
+        for row in rows:
+            keys = "?" if row["keys"] is None else row["keys"]
+            taken = datetime.fromtimestamp(row["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{row['id']:<36} {keys:>8} {format_bytes(row['bytes']):>10}  {taken}")
+
+
+def cmd_restore(namespace: str, snapshot_id: str) -> None:
+    """Roll a namespace back to a snapshot."""
+    backup = call({"op": "restore", "namespace": namespace, "name": snapshot_id})
+    print(f"Restored {namespace} to snapshot {snapshot_id}")
+    if backup:
+        print(f"  (previous state kept as snapshot {backup})")
+
+
+def cmd_export(namespace: str, snapshot_id: Optional[str] = None, output: Optional[str] = None) -> None:
+    """Write a namespace (or snapshot) as NDJSON to a file or stdout.
+
+    A running server is asked to flush and the file is then read directly,
+    so the export streams rather than travelling in one server response.
+    """
+    store = MemoryStore()
+    try:
+        if output is None:
+            store.export_ndjson(namespace, sys.stdout, snapshot_id)
+            return
+        with open(output, "w", encoding="utf-8") as f:
+            count = store.export_ndjson(namespace, f, snapshot_id)
+    except KeyError:
+        if snapshot_id:
+            raise OpError(f'No snapshot "{snapshot_id}" of {namespace}') from None
+        raise MissingError(f'Namespace "{namespace}" does not exist') from None
+    print(f"Exported {count} key(s) from {namespace} to {output}")
+
+
+def cmd_import(namespace: str, input_path: Optional[str] = None, replace: bool = False) -> None:
+    """Load NDJSON from a file or stdin into a namespace.
+
+    Import reads its input twice, so stdin is spooled to a temp file first;
+    the path is absolute so a running server can read it.
+    """
+    spool = None
+    if input_path is None:
+        spool = get_memory_dir() / f".import-{os.getpid()}.ndjson"
+        with open(spool, "w", encoding="utf-8") as f:
+            shutil.copyfileobj(sys.stdin, f)
+        input_path = spool
+    try:
+        count = call({"op": "import", "namespace": namespace,
+                      "path": str(Path(input_path).resolve()), "replace": replace})
+    finally:
+        if spool is not None:
+            spool.unlink(missing_ok=True)
+    print(f"Imported {count} key(s) into {namespace}")
+
+
 def print_usage():
     """Print usage information."""
     print(__doc__)
@@ -241,7 +2702,11 @@ def main():
             cmd_list(args[0])
 
         elif cmd == "list-all":
-            cmd_list_all()
+            cmd_list_all("--long" in args or "-l" in args)
+
+        elif cmd == "stats":
+            positional = [a for a in args if not a.startswith("--")]
+            cmd_stats(positional[0] if positional else None, "--refresh" in args)
 
         elif cmd == "clear":
             if len(args) != 1:
@@ -259,13 +2724,173 @@ def main():
             if len(args) < 1:
                 print("Usage: memory.py keys <namespace> [pattern]", file=sys.stderr)
                 sys.exit(1)
-            pattern = args[1] if len(args) > 1 else None
-            cmd_keys(args[0], pattern)
+            pattern = prefix = start = end = None
+            for arg in args[1:]:
+                if arg.startswith("--prefix="):
+                    prefix = arg.split("=", 1)[1]
+                elif arg.startswith("--start="):
+                    start = arg.split("=", 1)[1]
+                elif arg.startswith("--end="):
+                    end = arg.split("=", 1)[1]
+                elif arg.startswith("--pattern="):
+                    pattern = arg.split("=", 1)[1]
+                else:
+                    pattern = arg
+            cmd_keys(args[0], pattern, prefix, start, end)
+
+        elif cmd == "scan":
+            if len(args) < 1:
+                print("Usage: memory.py scan <namespace> [--cursor=<c>] [--count=<n>] "
+                      "[--prefix=<p>] [--pattern=<glob>]", file=sys.stderr)
+                sys.exit(1)
+            cursor, count, prefix, pattern = "0", 100, None, None
+            for arg in args[1:]:
+                if arg.startswith("--cursor="):
+                    cursor = arg.split("=", 1)[1]
+                elif arg.startswith("--count="):
+                    count = int(arg.split("=", 1)[1])
+                elif arg.startswith("--prefix="):
+                    prefix = arg.split("=", 1)[1]
+                elif arg.startswith("--pattern="):
+                    pattern = arg.split("=", 1)[1]
+            cmd_scan(args[0], cursor, count, prefix, pattern)
+
+        elif cmd == "incr":
+            if len(args) not in (2, 3):
+                print("Usage: memory.py incr <namespace> <key> [delta]", file=sys.stderr)
+                sys.exit(1)
+            cmd_incr(*args)
+
+        elif cmd == "append":
+            if len(args) < 3:
+                print("Usage: memory.py append <namespace> <key> <json>", file=sys.stderr)
+                sys.exit(1)
+            cmd_append(args[0], args[1], " ".join(args[2:]))
+
+        elif cmd == "cas":
+            if len(args) != 4:
+                print("Usage: memory.py cas <namespace> <key> <expected|--absent> <new>", file=sys.stderr)
+                sys.exit(1)
+            expected = None if args[2] == "--absent" else args[2]
+            cmd_cas(args[0], args[1], expected, args[3])
+
+        elif cmd == "patch":
+            if len(args) < 4:
+                print("Usage: memory.py patch <namespace> <key> <json-path> <value>", file=sys.stderr)
+                sys.exit(1)
+            cmd_patch(args[0], args[1], args[2], " ".join(args[3:]))
+
+        elif cmd == "index":
+            action = args[0] if args else None
+            if action not in ("create", "drop", "list") or len(args) != (2 if action == "list" else 3):
+                print("Usage: memory.py index create|drop <namespace> <json-path>\n"
+                      "       memory.py index list <namespace>", file=sys.stderr)
+                sys.exit(1)
+            cmd_index(*args)
+
+        elif cmd == "query":
+            conditions = [a for a in args[1:] if a != "--values"]
+            if len(args) < 2 or not conditions:
+                print("Usage: memory.py query <namespace> <path><op><value>... [--values]", file=sys.stderr)
+                sys.exit(1)
+            cmd_query(args[0], conditions, "--values" in args[1:])
+
+        elif cmd == "watch":
+            if len(args) < 1:
+                print("Usage: memory.py watch <namespace> [key|pattern] [--timeout=<sec>] [--since=<seq>]",
+                      file=sys.stderr)
+                sys.exit(1)
+            pattern, timeout, since = None, None, None
+            for arg in args[1:]:
+                if arg.startswith("--timeout="):
+                    timeout = float(arg.split("=", 1)[1])
+                elif arg.startswith("--since="):
+                    since = int(arg.split("=", 1)[1])
+                else:
+                    pattern = arg
+            cmd_watch(args[0], pattern, timeout, since)
+
+        elif cmd == "compact":
+            namespace, layout, compression, blob_threshold = None, "compact", "zlib", None
+            for arg in args:
+                if arg.startswith("--layout="):
+                    layout = arg.split("=", 1)[1]
+                elif arg.startswith("--compress="):
+                    compression = arg.split("=", 1)[1]
+                elif arg.startswith("--blob-threshold="):
+                    blob_threshold = int(arg.split("=", 1)[1])
+                elif namespace is None:
+                    namespace = arg
+            if layout not in ("compact", "pretty"):
+                print("Usage: memory.py compact [namespace] [--layout=compact|pretty] "
+                      "[--compress=none|zlib|lzma] [--blob-threshold=<bytes>]", file=sys.stderr)
+                sys.exit(1)
+            cmd_compact(namespace, layout, compression, blob_threshold)
+
+        elif cmd == "snapshot":
+            action = args[0] if args else None
+            positional = [a for a in args[1:] if not a.startswith("--")]
+            name = next((a.split("=", 1)[1] for a in args if a.startswith("--name=")), None)
+            if action == "drop" and len(positional) == 2:
+                name = positional.pop()
+            if action not in ("create", "list", "drop") or len(positional) != 1 or (action == "drop" and not name):
+                print("Usage: memory.py snapshot create <namespace> [--name=<id>]\n"
+                      "       memory.py snapshot list <namespace>\n"
+                      "       memory.py snapshot drop <namespace> <id>", file=sys.stderr)
+                sys.exit(1)
+            cmd_snapshot(action, positional[0], name)
+
+        elif cmd == "restore":
+            at = next((a.split("=", 1)[1] for a in args if a.startswith("--at=")), None)
+            positional = [a for a in args if not a.startswith("--")]
+            if len(positional) != 1 or not at:
+                print("Usage: memory.py restore <namespace> --at=<snapshot>", file=sys.stderr)
+                sys.exit(1)
+            cmd_restore(positional[0], at)
+
+        elif cmd == "export":
+            namespace, at, output = None, None, None
+            for arg in args:
+                if arg.startswith("--at="):
+                    at = arg.split("=", 1)[1]
+                elif arg.startswith("--output="):
+                    output = arg.split("=", 1)[1]
+                elif namespace is None:
+                    namespace = arg
+            if namespace is None:
+                print("Usage: memory.py export <namespace> [--at=<snapshot>] [--output=<file>]", file=sys.stderr)
+                sys.exit(1)
+            cmd_export(namespace, at, output)
+
+        elif cmd == "import":
+            namespace, input_path = None, None
+            for arg in args:
+                if arg.startswith("--input="):
+                    input_path = arg.split("=", 1)[1]
+                elif arg != "--replace" and namespace is None:
+                    namespace = arg
+            if namespace is None:
+                print("Usage: memory.py import <namespace> [--input=<file>] [--replace]", file=sys.stderr)
+                sys.exit(1)
+            cmd_import(namespace, input_path, "--replace" in args)
+
+        elif cmd == "serve":
+            flush_interval = DEFAULT_FLUSH_INTERVAL
+            for arg in args:
+                if arg.startswith("--flush-interval="):
+                    flush_interval = float(arg.split("=", 1)[1])
+                else:
+                    print("Usage: memory.py serve [--flush-interval=<seconds>]", file=sys.stderr)
+                    sys.exit(1)
+            cmd_serve(flush_interval)
 
         else:
             print(f"Unknown command: {cmd}", file=sys.stderr)
             print_usage()
 
+    except OpError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark and load test for memory.py.
+
+Usage:
+    memory_bench.py [--keys=<n>] [--value-size=<bytes>] [--large-every=<n>] [--large-size=<bytes>]
+                    [--ops=<n>] [--modes=api,cold,cli] [--writers=<n>] [--readers=<n>]
+                    [--worker-ops=<n>] [--concurrent-mode=cold|cli] [--server]
+                    [--dir=<path>] [--output=<file>]
+
+Populates a scratch memory directory (a temp dir unless --dir is given) with
+one namespace of --keys keys, then measures:
+
+  single      store/get/delete/keys latency in each mode:
+                api   one long-lived MemoryStore (in-process, cached)
+                cold  a fresh MemoryStore per op (the CLI minus process spawn)
+                cli   a memory.py subprocess per op
+  concurrent  --writers processes doing incr on a shared counter plus stores
+              of unique keys, alongside --readers processes doing gets; then
+              checks the counter and keys for lost updates and the files for
+              corruption
+
+With --server, a `memory.py serve` process is started in the scratch
+directory and only the cli mode is measured (through the server). Then an
+in-process server that stalls past SERVER_TIMEOUT, or drops the connection
+after running an op, checks that MemoryStore never runs an incr/append twice.
+The JSON report (p50/p95/p99 per op, throughput, integrity) goes to stdout
+or --output.
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import memory  # noqa: E402
+
+MEMORY_SCRIPT = SCRIPT_DIR / "memory.py"
+NAMESPACE = "bench"
+COUNTER_KEY = "counter"
+
+DEFAULTS = {
+    "keys": 1000,
+    "value_size": 64,
+    "large_every": 0,
+    "large_size": 256 * 1024,
+    "ops": 200,
+    "modes": "api,cold,cli",
+    "writers": 4,
+    "readers": 4,
+    "worker_ops": 50,
+    "concurrent_mode": "cold",
+    "server": False,
+    "dir": None,
+    "output": None,
+}
+
+
+def bench_key(i: int) -> str:
+    """Key name of the i-th populated entry (zero-padded so prefixes are selective)."""
+    return f"k{i:07d}"
+
+
+def make_value(size: int, seed: int) -> dict:
+    """A JSON object value of roughly size bytes."""
+    return {"id": seed, "payload": "x" * max(0, size - 24)}
+
+
+def percentiles(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 3),
+        "p50_ms": round(rank(50), 3),
+        "p95_ms": round(rank(95), 3),
+        "p99_ms": round(rank(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "ops_per_sec": round(len(ordered) / total, 1) if total else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Executors: run one protocol request in a given mode
+# ---------------------------------------------------------------------------
+
+def cli_args(request: dict) -> list:
+    """memory.py argv for a protocol request."""
+    op, ns, key = request["op"], request.get("namespace"), request.get("key")
+    if op == "store":
+        return ["store", ns, key, json.dumps(request["value"])]
+    if op in ("get", "delete", "exists"):
+        return [op, ns, key]
+    if op == "incr":
+        return ["incr", ns, key, str(request.get("delta", 1))]
+    if op == "keys":
+        return ["keys", ns, f"--prefix={request['prefix']}"]
+    raise ValueError(f"No CLI form for op {op}")
+
+
+def make_executor(mode: str, root: Path, use_server: bool = False):
+    """Return a callable(request) running requests against root in the given mode."""
+    memory_dir = root / "data" / "memory"
+    if mode == "api":
+        store = memory.MemoryStore(memory_dir)
+        return lambda request: memory.run_op(store, request)
+    if mode == "cold":
+        def run_cold(request):
+            store = memory.MemoryStore(memory_dir, stream_lookups=True)
+            try:
+                return memory.run_op(store, request)
+            finally:
+                store.flush()
+        return run_cold
+    if mode == "cli":
+        env = dict(os.environ)
+        if use_server:
+            env.pop("MEMORY_NO_SERVER", None)
+        else:
+            env["MEMORY_NO_SERVER"] = "1"
+
+        def run_cli(request):
+            result = subprocess.run([sys.executable, str(MEMORY_SCRIPT)] + cli_args(request),
+                                    cwd=root, env=env, capture_output=True, text=True)
+            if result.returncode != 0 and request["op"] not in ("exists",):
+                raise memory.OpError(result.stderr.strip())
+            return result.stdout
+        return run_cli
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+# ---------------------------------------------------------------------------
+# Phases
+# ---------------------------------------------------------------------------
+
+def make_root(directory) -> Path:
+    """Scratch project root: a marker dir so memory.py resolves data/memory inside it."""
+    root = Path(directory) if directory else Path(tempfile.mkdtemp(prefix="memory-bench-"))
+    (root / ".claude").mkdir(parents=True, exist_ok=True)
+    (root / "data" / "memory").mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def populate(root: Path, config: dict) -> dict:
+    """Fill the bench namespace in one batch."""
+    memory_dir = root / "data" / "memory"
+    store = memory.MemoryStore(memory_dir)
+    store.clear(NAMESPACE)
+    start = time.perf_counter()
+    with store:
+        for i in range(config["keys"]):
+            large = config["large_every"] and i % config["large_every"] == 0
+            store.set(NAMESPACE, bench_key(i), make_value(config["large_size"] if large else config["value_size"], i))
+        store.set(NAMESPACE, COUNTER_KEY, 0)
+    elapsed = time.perf_counter() - start
+    return {
+        "keys": config["keys"],
+        "seconds": round(elapsed, 3),
+        "file_bytes": memory.get_namespace_file(NAMESPACE, memory_dir).stat().st_size,
+    }
+
+
+def run_single(root: Path, mode: str, config: dict) -> dict:
+    """Latency of each op, one at a time, in one mode."""
+    execute = make_executor(mode, root, config["server"])
+    rng = random.Random(1)
+    n = config["ops"]
+    latencies = {"store": [], "get": [], "delete": [], "keys": []}
+
+    def timed(op, request):
+        start = time.perf_counter()
+        execute(request)
+        latencies[op].append(time.perf_counter() - start)
+
+    new_keys = [f"new-{mode}-{i}" for i in range(n)]
+    for i, key in enumerate(new_keys):
+        timed("store", {"op": "store", "namespace": NAMESPACE, "key": key,
+                        "value": make_value(config["value_size"], i)})
+    for _ in range(n):
+        key = bench_key(rng.randrange(config["keys"])) if config["keys"] else new_keys[0]
+        timed("get", {"op": "get", "namespace": NAMESPACE, "key": key})
+    for _ in range(n):
+        prefix = bench_key(rng.randrange(max(1, config["keys"])))[:-2]
+        timed("keys", {"op": "keys", "namespace": NAMESPACE, "prefix": prefix})
+    for key in new_keys:
+        timed("delete", {"op": "delete", "namespace": NAMESPACE, "key": key})
+
+    return {op: percentiles(samples) for op, samples in latencies.items()}
+
+
+def _worker(role: str, index: int, root: str, mode: str, config: dict, results) -> None:
+    """Concurrent writer/reader process body; reports latencies and errors."""
+    execute = make_executor(mode, Path(root), config["server"])
+    rng = random.Random(index)
+    latencies = {}
+    errors = []
+
+    def timed(op, request):
+        start = time.perf_counter()
+        try:
+            execute(request)
+        except Exception as e:
+            errors.append(f"{op}: {e}")
+        latencies.setdefault(op, []).append(time.perf_counter() - start)
+
+    for j in range(config["worker_ops"]):
+        if role == "writer":
+            timed("incr", {"op": "incr", "namespace": NAMESPACE, "key": COUNTER_KEY, "delta": 1})
+            timed("store", {"op": "store", "namespace": NAMESPACE, "key": f"w{index}-{j}",
+                            "value": {"writer": index, "seq": j}})
+        else:
+            key = bench_key(rng.randrange(config["keys"])) if config["keys"] else COUNTER_KEY
+            timed("get", {"op": "get", "namespace": NAMESPACE, "key": key})
+    results.put({"role": role, "latencies": latencies, "errors": errors})
+
+
+def check_integrity(root: Path, config: dict) -> dict:
+    """Look for lost updates, missing keys and unreadable files after the load test."""
+    memory_dir = root / "data" / "memory"
+    filepath = memory.get_namespace_file(NAMESPACE, memory_dir)
+    report = {"corrupt": False}
+    try:
+        with open(filepath, encoding="utf-8") as f:
+            data = json.load(f)
+    except ValueError as e:
+        report["corrupt"] = True
+        report["error"] = str(e)
+        return report
+
+    expected = config["writers"] * config["worker_ops"]
+    counter = data.get(COUNTER_KEY, 0)
+    missing = [f"w{i}-{j}" for i in range(config["writers"]) for j in range(config["worker_ops"])
+               if data.get(f"w{i}-{j}") != {"writer": i, "seq": j}]
+    store = memory.MemoryStore(memory_dir)
+    report.update({
+        "counter_expected": expected,
+        "counter_actual": counter,
+        "lost_increments": expected - counter,
+        "missing_keys": len(missing),
+        "key_index_consistent": store.keys(NAMESPACE) == sorted(data),
+        "backups": [p.name for p in memory_dir.glob("*.bak")],
+    })
+    report["ok"] = not report["lost_increments"] and not missing and report["key_index_consistent"]
+    return report
+
+
+def run_concurrent(root: Path, config: dict) -> dict:
+    """N writers and M readers in separate processes, then an integrity check."""
+    mode = config["concurrent_mode"]
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, args=("writer", i, str(root), mode, config, results))
+             for i in range(config["writers"])]
+    procs += [multiprocessing.Process(target=_worker, args=("reader", i, str(root), mode, config, results))
+              for i in range(config["readers"])]
+
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    reports = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    wall = time.perf_counter() - start
+
+    merged, errors = {}, []
+    for report in reports:
+        errors.extend(report["errors"])
+        for op, samples in report["latencies"].items():
+            merged.setdefault(op, []).extend(samples)
+    total_ops = sum(len(samples) for samples in merged.values())
+    return {
+        "mode": mode,
+        "writers": config["writers"],
+        "readers": config["readers"],
+        "wall_seconds": round(wall, 3),
+        "throughput_ops_per_sec": round(total_ops / wall, 1) if wall else None,
+        "latency": {op: percentiles(samples) for op, samples in merged.items()},
+        "errors": len(errors),
+        "error_samples": errors[:5],
+    }
+
+
+class _FaultyServer(memory.MemoryServer):
+    """In-process server that runs each op and then stalls past SERVER_TIMEOUT
+    (fault="stall") or drops the connection without responding (fault="drop")."""
+
+    def __init__(self, memory_dir: Path):
+        super().__init__(memory_dir / "memory.sock", flush_interval=0)
+        self.store = memory.MemoryStore(memory_dir, use_server=False)
+        self.fault = None
+        self.executed = 0
+
+    def handle_line(self, line: bytes) -> dict:
+        response = super().handle_line(line)
+        self.executed += 1
+        if self.fault == "stall":
+            time.sleep(memory.SERVER_TIMEOUT + 0.5)
+        elif self.fault == "drop":
+            raise ConnectionResetError  # the handler closes the connection unanswered
+        return response
+
+
+def run_fault_check(root: Path) -> dict:
+    """Atomic ops through MemoryStore against a server that stalls or drops the
+    connection after running them: each must run exactly once, never resent."""
+    memory_dir = root / "data" / "memory" / "faults"
+    memory_dir.mkdir(parents=True, exist_ok=True)
+    server = _FaultyServer(memory_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = memory.MemoryStore(memory_dir)
+        server.fault = "stall"
+        stalled = client.incr(NAMESPACE, COUNTER_KEY)
+        stalled_runs = server.executed
+        server.fault = "drop"
+        try:
+            client.append(NAMESPACE, "log", 1)
+            drop_error = None
+        except memory.OpError as e:
+            drop_error = str(e)
+        dropped_runs = server.executed - stalled_runs
+        server.fault = None
+        appended = client.get(NAMESPACE, "log")
+    finally:
+        server.shutdown()
+        server.server_close()
+        (memory_dir / "memory.sock").unlink(missing_ok=True)
+    report = {
+        "stalled_incr_result": stalled,
+        "stalled_incr_runs": stalled_runs,
+        "dropped_append_error": drop_error,
+        "dropped_append_runs": dropped_runs,
+        "appended_value": appended,
+    }
+    report["ok"] = stalled == 1 and stalled_runs == 1 and drop_error is not None \
+        and dropped_runs == 1 and appended == [1]
+    return report
+
+
+def start_server(root: Path) -> subprocess.Popen:
+    """Launch `memory.py serve` in the scratch root and wait for its socket."""
+    env = dict(os.environ)
+    env.pop("MEMORY_NO_SERVER", None)
+    env.pop("MEMORY_SOCKET", None)
+    proc = subprocess.Popen([sys.executable, str(MEMORY_SCRIPT), "serve"], cwd=root, env=env,
+                            stdout=subprocess.DEVNULL)
+    socket_path = root / "data" / "memory" / "memory.sock"
+    deadline = time.monotonic() + 10
+    while not socket_path.exists():
+        if proc.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("memory server failed to start")
+        time.sleep(0.05)
+    return proc
+
+
+def parse_args(argv: list) -> dict:
+    """Parse --name=value flags into a config dict."""
+    config = dict(DEFAULTS)
+    for arg in argv:
+        if arg == "--server":
+            config["server"] = True
+            continue
+        if not arg.startswith("--") or "=" not in arg:
+            print(__doc__)
+            sys.exit(1)
+        name, value = arg[2:].split("=", 1)
+        name = name.replace("-", "_")
+        if name not in config:
+            print(f"Unknown option: --{name}", file=sys.stderr)
+            sys.exit(1)
+        config[name] = value if isinstance(DEFAULTS[name], str) or DEFAULTS[name] is None else int(value)
+    return config
+
+
+def main():
+    config = parse_args(sys.argv[1:])
+    modes = [m for m in config["modes"].split(",") if m]
+    if config["server"]:
+        modes, config["concurrent_mode"] = ["cli"], "cli"
+
+    root = make_root(config["dir"])
+    server = None
+    report = {"config": {k: v for k, v in config.items() if k != "output"}}
+    try:
+        report["populate"] = populate(root, config)
+        if config["server"]:
+            server = start_server(root)
+        report["single"] = {}
+        for mode in modes:
+            print(f"Measuring {mode} ops...", file=sys.stderr)
+            report["single"][mode] = run_single(root, mode, config)
+        if config["writers"] or config["readers"]:
+            print(f"Running {config['writers']} writer(s) / {config['readers']} reader(s)...", file=sys.stderr)
+            report["concurrent"] = run_concurrent(root, config)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if "concurrent" in report:
+        report["concurrent"]["integrity"] = check_integrity(root, config)
+    if config["server"]:
+        print("Checking stalled and dropped server responses...", file=sys.stderr)
+        report["faults"] = run_fault_check(root)
+    if not config["dir"]:
+        shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if config["output"]:
+        Path(config["output"]).write_text(output + "\n", encoding="utf-8")
+        print(f"Report written to {config['output']}", file=sys.stderr)
+    else:
+        print(output)
+    integrity = report.get("concurrent", {}).get("integrity", {})
+    sys.exit(0 if integrity.get("ok", True) and report.get("faults", {}).get("ok", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for daily_changelog.py.
+
+Usage:
+    changelog_bench.py [--days=<n>] [--commits-per-day=<n>] [--latency=<seconds>]
+                       [--error-rate=<0-1>] [--workers=<n,n,...>] [--rpm=<n>] [--burst=<n>]
+                       [--retry-base=<seconds>] [--token-budget=<n>] [--seed=<n>]
+                       [--dir=<path>] [--output=<file>]
+
+Builds a synthetic git history (in a temp dir unless --dir is given): --days
+days of about --commits-per-day commits each, spread over the game's areas
+with the usual mix of real, repeated and "wip"/"fix typo" messages. It then
+replays the history through the real pipeline, with the offline summarizer
+standing in for the API (--latency per call, failing at --error-rate):
+
+  backfill  a cold backfill of the whole history (cache off) for each
+            --workers value: days/s, commits/s, per-call latency, effective
+            concurrency, retries and time spent waiting on the rate limiter
+  daily     the scheduler's incremental run after one more day of commits
+
+Nothing touches the network or the real changelog folder. The JSON report goes
+to stdout or --output; the pipeline's own progress lines go to stderr.
+"""
+
+import contextlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DEFAULTS = {
+    "days": 30,
+    "commits_per_day": 15,
+    "latency": 0.3,
+    "error_rate": 0.05,
+    "workers": "1,4,8",
+    "rpm": 600,
+    "burst": 10,
+    "retry_base": 0.1,
+    "token_budget": 0,
+    "seed": 0,
+    "dir": None,
+    "output": None,
+}
+
+# Synthetic history: areas and files commits touch, and message templates
+AREA_FILES = {
+    "src/components": ["ChatPanel.jsx", "Lobby.jsx", "DateScene.jsx", "VotingBar.jsx", "Results.jsx"],
+    "src/services": ["llmService.js", "partyClient.js", "attributeService.js"],
+    "src/store": ["gameStore.js"],
+    "partykit": ["server.ts", "registry.ts"],
+    "prompts": ["dater.md", "attributes.md", "narrator.md"],
+    "docs": ["DEPLOYMENT.md"],
+}
+SUBJECTS = [
+    "Add {thing} to the {screen}",
+    "Fix {thing} on the {screen}",
+    "Make the {screen} {quality}",
+    "Tweak dater prompt for {quality} replies",
+    "Sync {thing} between players",
+    "Refactor {thing} handling",
+]
+THINGS = ["round timer", "vote counts", "attribute cards", "chat bubbles", "reconnect logic", "host controls"]
+SCREENS = ["lobby", "date scene", "results screen", "voting bar", "chat panel"]
+QUALITIES = ["warmer", "snappier", "clearer", "funnier", "more natural"]
+TRIVIAL = ["wip", "fix typo", "cleanup", "tweaks"]
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(rank(50), 3),
+        "p95_ms": round(rank(95), 3),
+        "p99_ms": round(rank(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Synthetic history
+# ---------------------------------------------------------------------------
+def commit_message(rng):
+    """A subject (sometimes with a body) in the style of the real history."""
+    if rng.random() < 0.25:
+        return rng.choice(TRIVIAL)
+    subject = rng.choice(SUBJECTS).format(
+        thing=rng.choice(THINGS), screen=rng.choice(SCREENS), quality=rng.choice(QUALITIES))
+    if rng.random() < 0.4:
+        subject += "\n\nPlayers were confused when this happened mid-round; it now behaves consistently."
+    return subject
+
+
+def fast_import_data(text):
+    encoded = text.encode("utf-8")
+    return b"data %d\n%s\n" % (len(encoded), encoded)
+
+
+def append_history(repo, rng, days, commits_per_day, state):
+    """
+    Add commits for the given days (midnight datetimes) to repo with one
+    `git fast-import`. state carries file contents and the last mark between calls.
+    """
+    stream = []
+    # Marks only live for one fast-import run, so the first new commit follows the branch tip
+    parent = b"refs/heads/main^0" if state["mark"] else None
+    for day in days:
+        count = rng.randint(max(1, commits_per_day // 2), max(1, commits_per_day * 3 // 2))
+        times = sorted(rng.uniform(9, 23) for _ in range(count))
+        for hours in times:
+            when = (day + timedelta(hours=hours)).astimezone()
+            stamp = f"{int(when.timestamp())} {when.strftime('%z')}"
+            state["mark"] += 1
+            stream.append(b"commit refs/heads/main\nmark :%d\n" % state["mark"])
+            stream.append(f"author Bench <bench@example.com> {stamp}\n".encode())
+            stream.append(f"committer Bench <bench@example.com> {stamp}\n".encode())
+            stream.append(fast_import_data(commit_message(rng)))
+            if parent:
+                stream.append(b"from %s\n" % parent)
+            parent = b":%d" % state["mark"]
+            area = rng.choice(list(AREA_FILES))
+            for name in rng.sample(AREA_FILES[area], rng.randint(1, min(3, len(AREA_FILES[area])))):
+                path = f"{area}/{name}"
+                lines = state["files"].setdefault(path, [])
+                lines.extend(f"// change {state['mark']}.{i}" for i in range(rng.randint(1, 30)))
+                for _ in range(min(len(lines) // 4, rng.randint(0, 10))):
+                    lines.pop(rng.randrange(len(lines)))
+                stream.append(f"M 100644 inline {path}\n".encode())
+                stream.append(fast_import_data("\n".join(lines) + "\n"))
+            stream.append(b"\n")
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=repo, input=b"".join(stream), check=True)
+
+
+def make_history(root, config, rng):
+    """Repo with commits on each of the --days days before yesterday; returns the fast-import state."""
+    repo = root / "repo"
+    repo.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    subprocess.run(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=repo, check=True)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=n) for n in range(config["days"] + 1, 1, -1)]
+    state = {"mark": 0, "files": {}}
+    append_history(repo, rng, days, config["commits_per_day"], state)
+    return state
+
+
+# ---------------------------------------------------------------------------
+# Replays
+# ---------------------------------------------------------------------------
+def reset_pipeline(dc, config):
+    """Empty changelog folder and a fresh summarizer, rate limiter and metrics for one replay."""
+    shutil.rmtree(dc.CHANGELOG_FOLDER, ignore_errors=True)
+    dc.CHANGELOG_FOLDER.mkdir(parents=True)
+    dc.summarizer = dc.OfflineSummarizer(config["latency"], config["error_rate"], seed=config["seed"])
+    dc.api_rate_limiter = dc.TokenBucket(config["rpm"] / 60, config["burst"])
+    dc.RETRY_BASE_DELAY = config["retry_base"]
+    if config["token_budget"]:
+        dc.PROMPT_TOKEN_BUDGET = config["token_budget"]
+        dc.check_token_budget()
+
+
+def last_run_metrics(dc):
+    """The record the pipeline appended to its metrics file for the last run."""
+    with open(dc.METRICS_FILE) as f:
+        return json.loads(f.read().splitlines()[-1])
+
+
+def summarize_run(run):
+    """Throughput, latency and retry figures from one metrics record."""
+    wall = run["wall_s"] or 1e-9
+    return {
+        "success": run["success"],
+        "wall_s": run["wall_s"],
+        "days": run.get("days", 0),
+        "commits": run.get("commits", 0),
+        "days_per_sec": round(run.get("days", 0) / wall, 2),
+        "commits_per_sec": round(run.get("commits", 0) / wall, 1),
+        "api_calls": run.get("api_calls", 0),
+        "api_errors": run.get("api_errors", 0),
+        "retries": run.get("retries", 0),
+        "failed": run["errors"],
+        "api_latency": percentiles(run.get("api_latency_s", [])),
+        # Average number of summarizer calls in flight over the run
+        "effective_concurrency": round(run["stages"].get("api", 0) / wall, 2),
+        "stages_s": run["stages"],
+        "git_calls": run.get("git_calls", 0),
+        "input_tokens": run.get("input_tokens", 0),
+        "commit_bytes": run.get("commit_bytes", 0),
+        "prompt_bytes": run.get("prompt_bytes", 0),
+    }
+
+
+def run_backfill(dc, config, workers):
+    reset_pipeline(dc, config)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dc.backfill(today - timedelta(days=config["days"] + 1), today - timedelta(days=1), workers, cache="off")
+    return summarize_run(last_run_metrics(dc))
+
+
+def run_daily(dc, config, repo, rng, history):
+    """First scheduled run over the history, then the measured incremental run after one more day."""
+    reset_pipeline(dc, config)
+    dc.generate_changelog(cache="off")
+    yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    append_history(repo, rng, [yesterday], config["commits_per_day"], history)
+    dc.generate_changelog(cache="off")
+    return summarize_run(last_run_metrics(dc))
+
+
+def parse_args(argv):
+    """Parse --name=value flags into a config dict."""
+    config = dict(DEFAULTS)
+    for arg in argv:
+        if not arg.startswith("--") or "=" not in arg:
+            print(__doc__)
+            sys.exit(1)
+        name, value = arg[2:].split("=", 1)
+        name = name.replace("-", "_")
+        if name not in config:
+            print(f"Unknown option: --{name}", file=sys.stderr)
+            sys.exit(1)
+        default = DEFAULTS[name]
+        config[name] = value if isinstance(default, str) or default is None else type(default)(value)
+    return config
+
+
+def main():
+    config = parse_args(sys.argv[1:])
+    root = Path(config["dir"]) if config["dir"] else Path(tempfile.mkdtemp(prefix="changelog-bench-"))
+    rng = random.Random(config["seed"])
+    report = {"config": {k: v for k, v in config.items() if k != "output"}}
+    try:
+        print(f"Building {config['days']} day(s) of synthetic history...", file=sys.stderr)
+        history = make_history(root, config, rng)
+        report["history"] = {"commits": history["mark"], "files": len(history["files"])}
+
+        # The pipeline reads its repo, output folder and backend when it is imported
+        os.environ.update(CHANGELOG_REPO=str(root / "repo"), CHANGELOG_FOLDER=str(root / "out"),
+                          CHANGELOG_SUMMARIZER="offline")
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        import daily_changelog as dc
+
+        report["backfill"] = {}
+        for workers in [int(w) for w in config["workers"].split(",") if w]:
+            print(f"Backfilling with {workers} worker(s)...", file=sys.stderr)
+            with contextlib.redirect_stdout(sys.stderr):
+                report["backfill"][str(workers)] = run_backfill(dc, config, workers)
+        print("Replaying a daily incremental run...", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            report["daily"] = run_daily(dc, config, root / "repo", rng, history)
+    finally:
+        if not config["dir"]:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if config["output"]:
+        Path(config["output"]).write_text(output + "\n", encoding="utf-8")
+        print(f"Report written to {config['output']}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,42 @@
 #!/usr/bin/env python3
 """
 Daily Changelog Generator
-Runs every weekday at 10am to summarize the most recent day that had git activity.
-Walks backward from yesterday until it finds a day with commits (future-proof:
-handles weekends, holidays, or any day with no changes).
-Saves a txt file to the Desktop/Daily Changelog folder.
+Runs every weekday at 10am (catching up runs missed while the machine was asleep or
+off) and writes a changelog for every day whose commits changed since the last run.
+Each run reads only the commits made since the last processed HEAD (rescanning the
+last MAX_DAYS_BACK days on the first run or after history is rewritten) and keeps
+per-day commit sets in a state file, so weekends and days off need no special casing.
+Saves a txt file per day to the Desktop/Daily Changelog folder.
 """
 
 import subprocess
 import os
+import sys
+import json
+import difflib
+import fcntl
+import functools
+import hashlib
+import math
+import random
+import re
+import signal
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
-import schedule
 import time
-import anthropic
 
-# Configuration
-REPO_PATH = "/Users/seankearney/BadDateDemo"
+try:
+    import anthropic
+except ImportError:  # only AnthropicSummarizer needs it; the offline summarizer runs without it
+    anthropic = None
+
+# Configuration (CHANGELOG_REPO / CHANGELOG_FOLDER override the defaults, e.g. for benchmarks)
+REPO_PATH = os.environ.get("CHANGELOG_REPO", "/Users/seankearney/BadDateDemo")
 DESKTOP_PATH = Path.home() / "Desktop"
-CHANGELOG_FOLDER = DESKTOP_PATH / "Daily Changelog"
+CHANGELOG_FOLDER = Path(os.environ.get("CHANGELOG_FOLDER", DESKTOP_PATH / "Daily Changelog"))
 
 def get_api_key():
     """Get API key from environment or .env file."""
@@ -36,51 +54,698 @@ def get_api_key():
                     return line.split("=", 1)[1].strip()
     return ""
 
-ANTHROPIC_API_KEY = get_api_key()
-
 # How far back to look for a day with commits (avoid infinite loop)
 MAX_DAYS_BACK = 14
 
+# Incremental state: last processed commit and the commits seen for each day
+STATE_FILE = CHANGELOG_FOLDER / ".changelog_state.json"
+
+# Days older than this drop their commits from the state file (summarized ones keep their SHAs)
+STATE_RETENTION_DAYS = 90
+
+# Model settings for summaries
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 1500
+
+# Summarizer backend: "anthropic", or "offline" for a deterministic local stand-in that
+# needs no network or key (latency and error rate are configurable for benchmarks)
+SUMMARIZER = os.environ.get("CHANGELOG_SUMMARIZER", "anthropic")
+OFFLINE_LATENCY = float(os.environ.get("CHANGELOG_OFFLINE_LATENCY", "0"))
+OFFLINE_ERROR_RATE = float(os.environ.get("CHANGELOG_OFFLINE_ERROR_RATE", "0"))
+
+# Stream summaries into a .partial file next to the changelog as they are generated,
+# renamed over the real file when done (CHANGELOG_STREAM=1 or --stream)
+STREAM_OUTPUT = os.environ.get("CHANGELOG_STREAM") == "1"
+
+# Bump whenever the prompt wording changes so cached summaries aren't reused
+PROMPT_VERSION = 3
+
+# Commit digest: files are grouped into areas by top-level folder, or deeper for
+# folders listed here (src/components, src/services, ...)
+AREA_DEPTH = {"src": 2}
+# Subjects (after normalize_subject) that carry no information on their own
+TRIVIAL_SUBJECTS = {
+    "wip", "typo", "typos", "fix typo", "fix typos", "fix", "fixes", "minor fix", "minor fixes",
+    "cleanup", "clean up", "tweak", "tweaks", "update", "updates", "misc", "test", "temp",
+}
+# Subjects at least this similar (difflib ratio) within an area are merged
+NEAR_DUPLICATE_RATIO = 0.8
+DIGEST_TOP_FILES = 4
+DIGEST_BODY_CHARS = 200
+DIGEST_SOURCE = ('the git commits, as a digest grouped by the part of the code they touched '
+                 '(with lines added/removed; "(xN)" marks N similar commits)')
+
+# Commit text estimated above this many tokens is summarized in chunks first
+# (map), then the chunk notes are turned into the final summary (reduce)
+PROMPT_TOKEN_BUDGET = 6000
+MAP_MAX_TOKENS = 700
+MAP_WORKERS = 4
+
+# Summary cache: API responses keyed by a hash of everything that shapes them
+CACHE_FOLDER = CHANGELOG_FOLDER / ".cache"
+CACHE_MAX_AGE_DAYS = 30
+CACHE_MAX_BYTES = 5 * 1024 * 1024
+
+# Cache hits/misses for the current run
+cache_stats = {"hits": 0, "misses": 0}
+cache_stats_lock = threading.Lock()
+
+# Scheduler: weekdays (Monday=0) at 10:00. The last run is persisted so runs missed
+# while the machine slept or was off are caught up; the lock allows one scheduler.
+RUN_WEEKDAYS = {0, 1, 2, 3, 4}
+RUN_HOUR, RUN_MINUTE = 10, 0
+SCHEDULER_FILE = CHANGELOG_FOLDER / ".scheduler.json"
+SCHEDULER_LOCK = CHANGELOG_FOLDER / ".scheduler.lock"
+# Monotonic timers can pause while the machine sleeps, so long waits are split up and
+# the wall clock re-checked at least this often
+SCHEDULER_MAX_SLEEP = 300
+
+# One JSON line per run (daily, backfill, rollup): stage timings, git calls, tokens...
+METRICS_FILE = CHANGELOG_FOLDER / ".metrics.jsonl"
+run_metrics = {}
+run_metrics_lock = threading.Lock()
+
+# API pacing shared by every caller (daily runs and backfill workers)
+API_REQUESTS_PER_MINUTE = 50
+API_BURST = 5
+
+# Retries for rate limits, overload and network errors (exponential backoff with jitter)
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 2.0
+
+# Concurrent summaries during --backfill
+BACKFILL_WORKERS = 4
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter: acquire() blocks until a token is free."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+api_rate_limiter = TokenBucket(API_REQUESTS_PER_MINUTE / 60, API_BURST)
+
+
+class AnthropicSummarizer:
+    """Summarizer backed by the Anthropic Messages API."""
+
+    def __init__(self, api_key, model=MODEL):
+        self.api_key = api_key
+        self.model = model
+        self.client = None
+        self.client_lock = threading.Lock()
+
+    def unavailable(self):
+        """Why this backend can't be used, or None."""
+        if anthropic is None:
+            return "the anthropic package is not installed (pip install -r requirements.txt)."
+        if not self.api_key:
+            return "ANTHROPIC_API_KEY not set in environment variables."
+        return None
+
+    def get_client(self):
+        """
+        One client for the life of the process, created on first use. It is thread-safe
+        and its connection pool keeps connections alive between calls, so backfill
+        workers and later scheduled runs reuse them instead of reconnecting.
+        """
+        with self.client_lock:
+            if self.client is None:
+                # Retries are handled by call_summarizer so they share the rate limiter and backoff
+                self.client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
+            return self.client
+
+    def complete(self, prompt, max_tokens, on_text=None):
+        """
+        One API request. Returns (text, input_tokens, output_tokens); raises on failure.
+        With on_text, the response is streamed and on_text is called with each piece.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        if on_text is None:
+            response = self.get_client().messages.create(model=self.model, max_tokens=max_tokens, messages=messages)
+        else:
+            with self.get_client().messages.stream(model=self.model, max_tokens=max_tokens, messages=messages) as stream:
+                for text in stream.text_stream:
+                    on_text(text)
+                response = stream.get_final_message()
+        usage = getattr(response, "usage", None)
+        return (response.content[0].text,
+                getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0)
+
+    def is_retryable(self, error):
+        """Rate limits, overloaded/5xx responses and connection problems are worth retrying."""
+        if isinstance(error, (anthropic.APIConnectionError, anthropic.RateLimitError)):
+            return True
+        return isinstance(error, anthropic.APIStatusError) and error.status_code >= 500
+
+
+class OfflineSummarizerError(Exception):
+    """Failure injected by OfflineSummarizer, standing in for an overloaded API."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OfflineSummarizer:
+    """
+    Deterministic local stand-in for the API, for running and benchmarking the pipeline
+    without network or key. Each call sleeps about `latency` seconds and fails with
+    probability `error_rate`; both are derived from a hash of the prompt and attempt
+    number, so a replay behaves the same whatever the thread timing. The reply echoes
+    the "- " lines of the prompt's material under its theme line.
+    """
+
+    model = "offline"
+
+    def __init__(self, latency=0.0, error_rate=0.0, jitter=0.25, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.seed = seed
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def unavailable(self):
+        return None
+
+    def complete(self, prompt, max_tokens, on_text=None):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self.lock:
+            attempt = self.attempts[digest] = self.attempts.get(digest, 0) + 1
+        draw = hashlib.sha256(f"{self.seed}:{attempt}:{digest}".encode()).digest()
+        time.sleep(self.latency * (1 + self.jitter * (draw[0] / 127.5 - 1)))
+        if int.from_bytes(draw[1:5], "big") / 2 ** 32 < self.error_rate:
+            raise OfflineSummarizerError("offline summarizer: injected overload error")
+
+        material = re.split(r"\n\n(?:Create a narrative|List the distinct)", prompt, maxsplit=1)[0]
+        notes = [line.strip() for line in material.splitlines() if line.startswith("- ")]
+        theme = re.search(r'Start with "(.+?): \[Theme\]"', prompt)
+        if theme:
+            lines = [f"{theme.group(1)}: Offline Summary", f"An offline summary of {len(notes)} change(s)."]
+            lines += [f"• **{note[2:].split(' (x')[0]}** — summarized offline" for note in notes]
+        else:
+            lines = notes
+        text = "\n".join(lines)[:max_tokens * 4]
+        if on_text is not None:
+            for line in text.splitlines(keepends=True):
+                on_text(line)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+
+    def is_retryable(self, error):
+        return isinstance(error, OfflineSummarizerError)
+
+
+summarizer = None
+summarizer_lock = threading.Lock()
+
+
+def get_summarizer():
+    """The summarizer backend chosen by SUMMARIZER, created on first use (the API key is resolved then)."""
+    global summarizer
+    with summarizer_lock:
+        if summarizer is None:
+            if SUMMARIZER == "offline":
+                summarizer = OfflineSummarizer(OFFLINE_LATENCY, OFFLINE_ERROR_RATE)
+            else:
+                summarizer = AnthropicSummarizer(get_api_key())
+        return summarizer
+
+
+class StreamingOutput:
+    """
+    A file written while its summary streams in: path.partial holds the header and
+    the text so far, and finish() renames it over path once the summary is complete.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".partial")
+        self.header = header
+        self.file = None
+        self.text = ""
+
+    def restart(self):
+        """Start (or, before a retry, start over) with just the header."""
+        if self.file is not None:
+            self.file.close()
+        CHANGELOG_FOLDER.mkdir(exist_ok=True)
+        self.file = open(self.tmp_path, "w")
+        self.file.write(self.header)
+        self.file.flush()
+        self.text = ""
+
+    def write(self, text):
+        self.file.write(text)
+        self.file.flush()
+        self.text += text
+
+    def finish(self, summary, footer):
+        """Complete the file with footer and rename it into place. summary is rewritten if it
+        isn't what was streamed (a cache hit, an error, or condensed notes)."""
+        if self.file is None or self.text != summary:
+            self.restart()
+            self.write(summary)
+        self.file.write(footer)
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_path, self.path)
+
+
+def record_metric(**amounts):
+    """Add to the current run's metrics (no-op outside a metered run). Lists are extended."""
+    with run_metrics_lock:
+        if not run_metrics:
+            return
+        for name, amount in amounts.items():
+            run_metrics[name] = run_metrics.get(name, [] if isinstance(amount, list) else 0) + amount
+
+
+@contextmanager
+def timed(stage):
+    """Add the time spent in the block to the current run's stage total (summed across threads)."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        with run_metrics_lock:
+            if run_metrics:
+                stages = run_metrics["stages"]
+                stages[stage] = stages.get(stage, 0) + elapsed
+
+
+def metered(mode):
+    """
+    Decorator: append one record to METRICS_FILE per call. A metered call made inside
+    another (a rollup's backfill) counts towards the outer run.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with run_metrics_lock:
+                nested = bool(run_metrics)
+                if not nested:
+                    run_metrics.update(run=datetime.now().isoformat(timespec="seconds"), mode=mode,
+                                       stages={}, errors=0, started=time.monotonic())
+            if nested:
+                return func(*args, **kwargs)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                record_metric(errors=1)
+                raise
+            finally:
+                write_run_metrics()
+            return result
+        return wrapper
+    return decorate
+
+
+def write_run_metrics():
+    """Append the current run's record to METRICS_FILE and reset it."""
+    with run_metrics_lock:
+        record = dict(run_metrics)
+        run_metrics.clear()
+    record["wall_s"] = round(time.monotonic() - record.pop("started"), 3)
+    record["stages"] = {stage: round(elapsed, 3) for stage, elapsed in record["stages"].items()}
+    record["success"] = record["errors"] == 0
+    record["cache_hits"], record["cache_misses"] = cache_stats["hits"], cache_stats["misses"]
+    try:
+        CHANGELOG_FOLDER.mkdir(exist_ok=True)
+        with open(METRICS_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not write metrics: {e}")
+
 
-def get_commits_for_date(target_date):
-    """Get all commit messages for a single calendar day. Returns (commit_text, target_date)."""
-    day_start = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    day_end = day_start + timedelta(days=1)
-    since_str = day_start.strftime("%Y-%m-%d %H:%M:%S")
-    until_str = day_end.strftime("%Y-%m-%d %H:%M:%S")
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def report_metrics():
+    """Print p50/p95 timings and totals over every run in METRICS_FILE."""
     try:
+        with open(METRICS_FILE) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        runs = []
+    if not runs:
+        print(f"No runs recorded in {METRICS_FILE} yet.")
+        return
+
+    failed = sum(1 for run in runs if not run["success"])
+    modes = {}
+    for run in runs:
+        modes[run["mode"]] = modes.get(run["mode"], 0) + 1
+    print(f"{len(runs)} run(s) from {runs[0]['run']} to {runs[-1]['run']}: "
+          + ", ".join(f"{count} {mode}" for mode, count in sorted(modes.items()))
+          + f"; {failed} failed")
+
+    rows = [("wall", [run["wall_s"] for run in runs])]
+    for stage in ("git", "prompt", "rate_limit", "api", "retry_wait", "write"):
+        rows.append((stage, [run["stages"].get(stage, 0) for run in runs]))
+    latencies = [latency for run in runs for latency in run.get("api_latency_s", [])]
+    print(f"\n{'seconds':<16}{'p50':>9}{'p95':>9}{'total':>10}")
+    for name, values in rows:
+        print(f"{name:<16}{percentile(values, 50):>9.2f}{percentile(values, 95):>9.2f}{sum(values):>10.1f}")
+    if latencies:
+        print(f"{'per API call':<16}{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+              f"{sum(latencies):>10.1f}")
+    first_text = [latency for run in runs for latency in run.get("api_first_text_s", [])]
+    if first_text:
+        print(f"{'first text':<16}{percentile(first_text, 50):>9.2f}{percentile(first_text, 95):>9.2f}"
+              f"{sum(first_text):>10.1f}")
+
+    def total(name):
+        return sum(run.get(name, 0) for run in runs)
+
+    print(f"\nGit: {total('git_calls')} call(s)")
+    print(f"Summarized: {total('days')} day(s), {total('commits')} commit(s), "
+          f"{total('commit_bytes') / 1024:.1f} KB of messages sent as {total('prompt_bytes') / 1024:.1f} KB of digest")
+    print(f"API: {total('api_calls')} call(s), {total('retries')} retr{'y' if total('retries') == 1 else 'ies'}, "
+          f"{total('input_tokens')} input / {total('output_tokens')} output tokens")
+    print(f"Cache: {total('cache_hits')} hit(s), {total('cache_misses')} miss(es)")
+
+
+def git(*args):
+    """Run a git command in REPO_PATH and return its stdout."""
+    record_metric(git_calls=1)
+    with timed("git"):
         result = subprocess.run(
-            [
-                "git", "log",
-                f"--since={since_str}",
-                f"--until={until_str}",
-                "--pretty=format:%s%n%b---",
-            ],
+            ["git", *args],
             cwd=REPO_PATH,
             capture_output=True,
             text=True,
             check=True,
         )
-        out = result.stdout.strip()
-        return out, target_date
+    return result.stdout
+
+
+def git_log(*args):
+    """
+    Run `git log` with the given range/filters and parse the result.
+    Returns a list of commits, newest first: dicts with sha, date (author date as a
+    local ISO timestamp), subject, body and files ([added, deleted, path] per file,
+    from --numstat in the same call).
+    """
+    # Each commit starts with \x1e; NUL after every header field since subjects and
+    # bodies can contain anything else. The numstat lines follow the last NUL.
+    out = git("log", *args, "--numstat", "--no-renames", "--pretty=format:%x1e%H%x00%aI%x00%s%x00%b%x00")
+    commits = []
+    for record in out.split("\x1e")[1:]:
+        sha, author_date, subject, body, numstat = record.split("\0", 4)
+        authored = datetime.fromisoformat(author_date).astimezone().replace(tzinfo=None)
+        files = []
+        for line in numstat.strip().splitlines():
+            added, deleted, path = line.split("\t", 2)
+            # Binary files report "-" for both counts
+            files.append([int(added) if added != "-" else 0, int(deleted) if deleted != "-" else 0, path])
+        commits.append({
+            "sha": sha.strip(),
+            "date": authored.isoformat(),
+            "subject": subject,
+            "body": body.strip(),
+            "files": files,
+        })
+    return commits
+
+
+def commit_day(commit):
+    """Calendar day (midnight datetime) a commit was authored on."""
+    return datetime.fromisoformat(commit["date"]).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_commits_by_day(since_date, until_date):
+    """
+    Get every commit authored in [since_date, until_date) with a single `git log`.
+    Returns {day (midnight datetime): [commit, ...]}, newest commit first within each day.
+    """
+    since_str = since_date.strftime("%Y-%m-%d %H:%M:%S")
+    until_str = until_date.strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        commits = git_log(f"--since={since_str}", f"--until={until_str}")
     except subprocess.CalledProcessError as e:
-        print(f"Error getting git log for {target_date.date()}: {e}")
-        return "", target_date
+        print(f"Error getting git log for {since_date.date()} to {until_date.date()}: {e}")
+        record_metric(errors=1)
+        return {}
+
+    commits_by_day = {}
+    for commit in commits:
+        # --since/--until filter on committer date; bucket by author date, dropping
+        # commits (rebased, cherry-picked) whose author date falls outside the window
+        if not since_date <= datetime.fromisoformat(commit["date"]) < until_date:
+            continue
+        commits_by_day.setdefault(commit_day(commit), []).append(commit)
+    return commits_by_day
+
 
+def commit_area(path):
+    """Area of the game a file belongs to: its top-level folder, or deeper per AREA_DEPTH."""
+    parts = path.split("/")
+    if len(parts) == 1:
+        return "(root)"
+    depth = AREA_DEPTH.get(parts[0], 1)
+    return "/".join(parts[:min(depth, len(parts) - 1)])
 
-def find_most_recent_day_with_commits():
+
+def normalize_subject(subject):
+    """Lowercased subject with punctuation, numbers and extra whitespace removed, for matching."""
+    return " ".join("".join(ch if ch.isalpha() else " " for ch in subject.lower()).split())
+
+
+def format_commits(commits):
     """
-    Start from yesterday and walk backward until we find a day that has at least one commit.
-    Returns (commit_text, target_date) or (None, None) if no commits in the last MAX_DAYS_BACK days.
+    Compact digest of commits for the prompt. Commits are grouped by the area they
+    touched most (per --numstat), near-duplicate messages within an area are merged
+    into one line with a count, and trivial ones ("wip", "fix typo") are only counted.
+    Areas with a single commit get one line without file stats, and a body already
+    shown is not repeated, so per-area overhead stays small on quiet days.
+    """
+    if not commits:
+        return ""
+
+    areas = {}
+    for commit in reversed(commits):  # oldest first reads as the day's story
+        churn = {}
+        for added, deleted, path in commit.get("files", []):
+            area = commit_area(path)
+            churn[area] = churn.get(area, 0) + added + deleted + 1
+        group = areas.setdefault(max(churn, key=churn.get) if churn else "(no file changes)",
+                                 {"commits": 0, "added": 0, "deleted": 0, "files": {}, "messages": [], "trivial": []})
+        group["commits"] += 1
+        for added, deleted, path in commit.get("files", []):
+            group["added"] += added
+            group["deleted"] += deleted
+            name = path.rsplit("/", 1)[-1]
+            group["files"][name] = group["files"].get(name, 0) + added + deleted
+
+        key = normalize_subject(commit["subject"])
+        if len(key) < 3 or key in TRIVIAL_SUBJECTS:
+            group["trivial"].append(commit["subject"].strip())
+            continue
+        for message in group["messages"]:
+            if difflib.SequenceMatcher(None, key, message["key"]).ratio() >= NEAR_DUPLICATE_RATIO:
+                message["count"] += 1
+                message["body"] = message["body"] or commit["body"]
+                break
+        else:
+            group["messages"].append({"key": key, "subject": commit["subject"].strip(),
+                                      "body": commit["body"], "count": 1})
+
+    seen_bodies = set()
+
+    def message_lines(message, prefix):
+        count = f" (x{message['count']})" if message["count"] > 1 else ""
+        lines = [f"{prefix}{message['subject']}{count}"]
+        body = " ".join(message["body"].split())
+        if body and body not in seen_bodies:  # boilerplate bodies are shown once
+            seen_bodies.add(body)
+            lines.append(f"  {body[:DIGEST_BODY_CHARS]}{'...' if len(body) > DIGEST_BODY_CHARS else ''}")
+        return lines
+
+    sections = []
+    if len(areas) > 1:
+        total_added = sum(g["added"] for g in areas.values())
+        total_deleted = sum(g["deleted"] for g in areas.values())
+        sections.append(f"{len(commits)} commits, +{total_added}/-{total_deleted} lines")
+    # Areas with one real commit share a section, one line each, without file stats
+    singles = []
+    for area, group in sorted(areas.items(), key=lambda item: -item[1]["commits"]):
+        if not group["messages"]:
+            continue  # only trivial commits: counted below
+        if group["commits"] - len(group["trivial"]) == 1:
+            singles.extend(message_lines(group["messages"][0], f"- [{area}] "))
+            continue
+        top_files = sorted(group["files"], key=group["files"].get, reverse=True)
+        files = ", ".join(top_files[:DIGEST_TOP_FILES])
+        if len(top_files) > DIGEST_TOP_FILES:
+            files += f" (+{len(top_files) - DIGEST_TOP_FILES} more)"
+        lines = [f"[{area}] {group['commits']} commits, +{group['added']}/-{group['deleted']}"
+                 + (f": {files}" if files else "")]
+        for message in group["messages"]:
+            lines.extend(message_lines(message, "- "))
+        sections.append("\n".join(lines))
+    if singles:
+        sections.append("\n".join(["One commit each:"] + singles))
+    trivial = [t for group in areas.values() for t in group["trivial"]]
+    if trivial:
+        examples = ", ".join(dict.fromkeys(t.lower() for t in trivial))
+        sections.append(f"{len(trivial)} trivial commit(s): {examples[:DIGEST_BODY_CHARS]}")
+    return "\n\n".join(sections)
+
+
+def split_digest(digest):
+    """Chunkable entries of a digest: one per area, split per message when an area alone is over budget."""
+    entries = []
+    for section in digest.split("\n\n"):
+        if estimate_tokens(section) <= PROMPT_TOKEN_BUDGET:
+            entries.append(section)
+            continue
+        header, *messages = section.split("\n- ")
+        entries.extend(f"{header}\n- {message}" for message in messages)
+    return entries
+
+
+def load_state():
+    """Load the incremental state: {"repo", "head", "days": {"YYYY-MM-DD": {"commits", "summarized"}}}."""
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    if state.get("repo") != REPO_PATH:
+        state = {"repo": REPO_PATH, "head": None, "days": {}}
+
+    # State written before the commit digest has no per-file stats; fetch them in one call
+    missing = [c for record in state["days"].values() for c in record["commits"] if "files" not in c]
+    if missing:
+        try:
+            files = {c["sha"]: c["files"] for c in git_log("--no-walk", *{c["sha"] for c in missing})}
+        except subprocess.CalledProcessError:
+            files = {}
+        for commit in missing:
+            commit["files"] = files.get(commit["sha"], [])
+    return state
+
+
+def save_state(state):
+    """
+    Write the state file atomically. Days older than STATE_RETENTION_DAYS drop their
+    commits; summarized ones keep the commit set they were written from, which is
+    what backfill checks to tell whether their changelog file is current.
+    """
+    cutoff = (datetime.now() - timedelta(days=STATE_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    for day, record in list(state["days"].items()):
+        if day >= cutoff:
+            continue
+        if "summarized" in record:
+            state["days"][day] = {"commits": [], "summarized": record["summarized"]}
+        else:
+            del state["days"][day]
+    CHANGELOG_FOLDER.mkdir(exist_ok=True)
+    tmp_path = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    with timed("write"):
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, STATE_FILE)
+
+
+def ingest_new_commits(state):
+    """
+    Add commits made since the last run to the per-day commit sets in state.
+    If the last processed commit is still an ancestor of HEAD only `<last>..HEAD` is
+    read, so the cost is proportional to the new commits. On the first run or after
+    history was rewritten (rebase, reset) the last MAX_DAYS_BACK days are rescanned.
+    On the first run, days before the most recent active one are marked skipped
+    (left to --backfill); any day whose commits change later is no longer skipped.
+    Returns the number of commits read.
+    """
+    head = git("rev-parse", "HEAD").strip()
+    last = state.get("head")
+    if head == last:
+        return 0
+
+    days = state["days"]
+    before = {day: {c["sha"] for c in record["commits"]} for day, record in days.items()}
+    is_ancestor = False
+    if last:
+        try:
+            git("merge-base", "--is-ancestor", last, head)
+            is_ancestor = True
+        except subprocess.CalledProcessError:
+            pass  # exit 1: not an ancestor; 128: last is gone (e.g. after gc) -- rescan either way
+    if is_ancestor:
+        new_commits = git_log(f"{last}..{head}")
+    else:
+        since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=MAX_DAYS_BACK)
+        new_commits = git_log(f"--since={since.strftime('%Y-%m-%d %H:%M:%S')}", head)
+        # Rescanned days are rebuilt from scratch so rewritten commits don't linger
+        for day, record in days.items():
+            if day >= since.strftime("%Y-%m-%d"):
+                record["commits"] = []
+
+    for commit in new_commits:
+        record = days.setdefault(commit_day(commit).strftime("%Y-%m-%d"), {"commits": []})
+        record["commits"].append(commit)
+    for day, record in list(days.items()):
+        unique = {c["sha"]: c for c in record["commits"]}
+        record["commits"] = sorted(unique.values(), key=lambda c: c["date"], reverse=True)
+        if not record["commits"] and "summarized" not in record:
+            del days[day]
+        elif last and {c["sha"] for c in record["commits"]} != before.get(day):
+            record.pop("skipped", None)
+
+    if not last:
+        today = datetime.now().strftime("%Y-%m-%d")
+        past = [day for day, record in days.items() if record["commits"] and day < today]
+        for day in past:
+            if day < max(past) and "summarized" not in days[day]:
+                days[day]["skipped"] = True
+    state["head"] = head
+    return len(new_commits)
+
+
+def days_to_regenerate(state, force=False):
+    """
+    Days (YYYY-MM-DD, oldest first) before today whose changelog needs writing: every
+    day not marked skipped whose commit set differs from the one last summarized.
+    With force, the most recent active day in the last MAX_DAYS_BACK days is included
+    even if unchanged.
     """
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    for days_ago in range(1, MAX_DAYS_BACK + 1):
-        candidate = today - timedelta(days=days_ago)
-        commits, _ = get_commits_for_date(candidate)
-        if commits and commits.strip():
-            print(f"Found {len(commits.split('---'))} commit(s) on {candidate.strftime('%A, %Y-%m-%d')}.")
-            return commits.strip(), candidate
-    return None, None
+    window_start = (today - timedelta(days=MAX_DAYS_BACK)).strftime("%Y-%m-%d")
+    active = {
+        day: record for day, record in state["days"].items()
+        if record["commits"] and day < today.strftime("%Y-%m-%d")
+    }
+    pending = {
+        day for day, record in active.items()
+        if not record.get("skipped") and record.get("summarized") != sorted(c["sha"] for c in record["commits"])
+    }
+    recent = [day for day in active if day >= window_start]
+    if force and recent:
+        pending.add(max(recent))
+    return sorted(pending)
 
 
 def day_label_for_prompt(target_date):
@@ -104,19 +769,24 @@ def theme_line_start_for_day(target_date):
         return "Yesterday's Focus"
     return f"{target_date.strftime('%A')}'s Focus"  # e.g. "Friday's Focus"
 
-def summarize_with_claude(commit_messages, day_label="yesterday", theme_line_start="Yesterday's Focus"):
-    """Use Claude to create a narrative summary of the last workday's work."""
-    if not ANTHROPIC_API_KEY:
-        return "Error: ANTHROPIC_API_KEY not set in environment variables."
-    
-    if not commit_messages:
-        return f"No commits found from {day_label}."
-    
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    
-    prompt = f"""Here are the git commit messages from {day_label}'s work on a multiplayer dating game project called "Bad Date Demo":
+def estimate_tokens(text):
+    """Rough token count for budgeting (about 4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
 
-{commit_messages}
+def check_token_budget():
+    """Exit if a chunk's notes (up to MAP_MAX_TOKENS) could not fit the prompt budget."""
+    if PROMPT_TOKEN_BUDGET <= MAP_MAX_TOKENS:
+        print(f"PROMPT_TOKEN_BUDGET ({PROMPT_TOKEN_BUDGET}) must be larger than "
+              f"MAP_MAX_TOKENS ({MAP_MAX_TOKENS}).")
+        sys.exit(1)
+
+
+def build_prompt(material, day_label, theme_line_start, source=DIGEST_SOURCE):
+    """The final summary prompt; source describes what material is (commit digest or chunk notes)."""
+    return f"""Here are {source} from {day_label}'s work on a multiplayer dating game project called "Bad Date Demo":
+
+{material}
 
 Create a narrative daily summary for a general (non-technical) audience. Format:
 
@@ -139,40 +809,235 @@ Example bullet style:
 
 Return the formatted summary."""
 
+
+def build_map_prompt(chunk, day_label, part, parts, source=DIGEST_SOURCE):
+    """Prompt condensing one chunk of commits (or of earlier notes) into short notes."""
+    return f"""Here is part {part} of {parts} of {source} from {day_label}'s work on a multiplayer dating game project called "Bad Date Demo":
+
+{chunk}
+
+List the distinct changes in this part as short plain-English notes, one per line starting with "- ". Merge near-duplicates, drop trivial ones (typo fixes, "wip"), and keep any detail about why a change matters to players. Return only the notes."""
+
+
+def call_summarizer(prompt, max_tokens=MAX_TOKENS, output=None):
+    """
+    Send one prompt to the summarizer, with rate limiting and retries. Returns the text;
+    raises on failure. With output (a StreamingOutput) the response is streamed into it,
+    starting over on each retry.
+    """
+    backend = get_summarizer()
+    problem = backend.unavailable()
+    if problem:
+        raise RuntimeError(problem)
+    for attempt in range(MAX_RETRIES + 1):
+        with timed("rate_limit"):
+            api_rate_limiter.acquire()
+        started = time.monotonic()
+        on_text = None
+        if output is not None:
+            output.restart()
+
+            def stream_text(piece):
+                if not output.text:
+                    record_metric(api_first_text_s=[round(time.monotonic() - started, 3)])
+                output.write(piece)
+            on_text = stream_text
+        try:
+            with timed("api"):
+                text, input_tokens, output_tokens = backend.complete(prompt, max_tokens, on_text)
+            record_metric(api_calls=1, api_latency_s=[round(time.monotonic() - started, 3)],
+                          input_tokens=input_tokens, output_tokens=output_tokens)
+            return text
+        except Exception as e:
+            record_metric(api_calls=1, api_errors=1)
+            if attempt == MAX_RETRIES or not backend.is_retryable(e):
+                raise
+            record_metric(retries=1)
+            delay = retry_delay(e, attempt)
+            print(f"Summarizer error ({e}); retrying in {delay:.1f}s...")
+            with timed("retry_wait"):
+                time.sleep(delay)
+
+
+def chunk_entries(entries, token_budget):
+    """Pack entries, in order, into chunks of at most token_budget estimated tokens."""
+    chunks, current, used = [], [], 0
+    for entry in entries:
+        cost = estimate_tokens(entry)
+        if cost > token_budget:
+            entry = entry[:token_budget * 4] + "\n[truncated]"
+            cost = token_budget
+        if current and used + cost > token_budget:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        current.append(entry)
+        used += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def condense(entries, day_label, source=DIGEST_SOURCE):
+    """
+    Map step: summarize token-budgeted chunks of entries in parallel and return
+    the notes, repeating over the notes until they fit PROMPT_TOKEN_BUDGET or a
+    pass no longer reduces the number of chunks.
+    """
+    previous = math.inf
+    while True:
+        chunks = chunk_entries(entries, PROMPT_TOKEN_BUDGET)
+        if len(chunks) >= previous:
+            # The notes fill as many chunks as their input did: another pass won't converge
+            return entries
+        previous = len(chunks)
+        print(f"Condensing {len(chunks)} chunk(s) for {day_label}...")
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS) as pool:
+            notes = list(pool.map(
+                lambda item: call_summarizer(
+                    build_map_prompt(item[1], day_label, item[0], len(chunks), source), MAP_MAX_TOKENS
+                ),
+                enumerate(chunks, 1),
+            ))
+        # One chunk means the notes came from a single pass; stop even if still long
+        if len(chunks) == 1 or estimate_tokens("\n".join(notes)) <= PROMPT_TOKEN_BUDGET:
+            return notes
+        entries = notes
+
+
+def summarize_commits(commit_messages, day_label="yesterday", theme_line_start="Yesterday's Focus", output=None):
+    """
+    Use the summarizer to create a narrative summary of the last workday's work.
+    Commit text over PROMPT_TOKEN_BUDGET is condensed chunk by chunk first, so the
+    final prompt stays bounded however big the day was. The final summary is
+    streamed into output if given.
+    """
+    if not commit_messages:
+        return f"No commits found from {day_label}."
+    
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1500,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.content[0].text
+        if estimate_tokens(commit_messages) <= PROMPT_TOKEN_BUDGET:
+            prompt = build_prompt(commit_messages, day_label, theme_line_start)
+        else:
+            notes = condense(split_digest(commit_messages), day_label)
+            prompt = build_prompt("\n".join(notes), day_label, theme_line_start,
+                                  source="notes condensed from the git commits")
+        return call_summarizer(prompt, output=output)
     except Exception as e:
-        return f"Error calling Claude API: {e}"
+        return f"Error generating summary: {e}"
 
-def generate_changelog():
-    """Main function to generate and save the changelog."""
-    print(f"[{datetime.now()}] Generating daily changelog...")
-    
-    # Find the most recent day that had commits (walk back from yesterday)
-    commits, target_date = find_most_recent_day_with_commits()
-    
-    if not commits or not target_date:
-        print(f"No commits found in the last {MAX_DAYS_BACK} days. Skipping.")
-        return
-    
-    date_str = target_date.strftime("%Y-%m-%d")
+
+def retry_delay(error, attempt):
+    """Exponential backoff with jitter, or the server's retry-after if that is longer."""
+    delay = RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("retry-after")
+    try:
+        return max(delay, float(retry_after))
+    except (AttributeError, TypeError, ValueError):
+        return delay
+
+def summary_cache_key(*parts):
+    """Hash of everything that determines a summary: its inputs, prompt version and model settings."""
+    payload = json.dumps([*parts, PROMPT_VERSION, get_summarizer().model, MAX_TOKENS])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_summary(parts, summarize, cache="use"):
+    """
+    Return summarize() through the summary cache, keyed by summary_cache_key(*parts).
+    cache="use" reads and writes the cache, "refresh" ignores existing entries but
+    stores the new response, "off" bypasses it. Error responses are never cached.
+    """
+    if cache == "off":
+        return summarize()
+
+    path = CACHE_FOLDER / f"{summary_cache_key(*parts)}.txt"
+    if cache == "use":
+        try:
+            summary = path.read_text()
+            os.utime(path)  # eviction drops the least recently used entries first
+            with cache_stats_lock:
+                cache_stats["hits"] += 1
+            return summary
+        except FileNotFoundError:
+            pass
+    with cache_stats_lock:
+        cache_stats["misses"] += 1
+
+    summary = summarize()
+    if not summary.startswith("Error"):
+        CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(summary)
+        os.replace(tmp_path, path)
+    return summary
+
+
+def summarize_cached(commit_messages, day_label, theme_line_start, cache="use", output=None):
+    """summarize_commits behind the summary cache (see cached_summary)."""
+    if not commit_messages:
+        return summarize_commits(commit_messages, day_label, theme_line_start)
+    return cached_summary(
+        (commit_messages, day_label, theme_line_start),
+        lambda: summarize_commits(commit_messages, day_label, theme_line_start, output),
+        cache,
+    )
+
+
+def evict_summary_cache():
+    """
+    Remove cache entries unused for CACHE_MAX_AGE_DAYS, then the least recently used
+    ones until the cache fits in CACHE_MAX_BYTES. Returns the number removed.
+    """
+    if not CACHE_FOLDER.exists():
+        return 0
+    entries = sorted(
+        ((path.stat(), path) for path in CACHE_FOLDER.glob("*.txt")),
+        key=lambda entry: entry[0].st_mtime,
+        reverse=True,
+    )
+    cutoff = time.time() - CACHE_MAX_AGE_DAYS * 86400
+    total = removed = 0
+    for st, path in entries:
+        total += st.st_size
+        if st.st_mtime < cutoff or total > CACHE_MAX_BYTES:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def changelog_path(target_date):
+    """Output file for a day: CHANGELOG_FOLDER/changelog_YYYY-MM-DD.txt."""
+    return CHANGELOG_FOLDER / f"changelog_{target_date.strftime('%Y-%m-%d')}.txt"
+
+
+def write_changelog(target_date, commits, cache="use"):
+    """
+    Summarize one day's commits and save changelog_YYYY-MM-DD.txt.
+    Returns True if the summary succeeded (the file is written either way).
+    """
     day_name = target_date.strftime("%A")
     day_label = day_label_for_prompt(target_date)
     theme_line_start = theme_line_start_for_day(target_date)
     
-    summary = summarize_with_claude(commits, day_label, theme_line_start)
+    with timed("prompt"):
+        digest = format_commits(commits)
+    record_metric(days=1, commits=len(commits), prompt_bytes=len(digest.encode()),
+                  commit_bytes=sum(len(f"{c['subject']}\n{c['body']}".encode()) for c in commits))
     
-    # Create the output
-    output = f"""Bad Date Demo - Daily Summary
+    header = f"""Bad Date Demo - Daily Summary
 {day_name}, {target_date.strftime("%B %d, %Y")}
 {'=' * 50}
 
-{summary}
+"""
+    filepath = changelog_path(target_date)
+    stream = StreamingOutput(filepath, header) if STREAM_OUTPUT else None
+    
+    summary = summarize_cached(digest, day_label, theme_line_start, cache, stream)
+    if summary.startswith("Error"):
+        record_metric(errors=1)
+    footer = f"""
 
 ---
 Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
@@ -182,38 +1047,376 @@ Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
     CHANGELOG_FOLDER.mkdir(exist_ok=True)
     
     # Save to Daily Changelog folder
-    filename = f"changelog_{date_str}.txt"
-    filepath = CHANGELOG_FOLDER / filename
-    
-    with open(filepath, "w") as f:
-        f.write(output)
+    with timed("write"):
+        if stream is not None:
+            stream.finish(summary, footer)
+        else:
+            with open(filepath, "w") as f:
+                f.write(header + summary + footer)
     
     print(f"Changelog saved to: {filepath}")
+    return not summary.startswith("Error")
+
+
+@metered("daily")
+def generate_changelog(force=False, cache="use"):
+    """
+    Main function: ingest new commits and regenerate every day whose commits changed.
+    With force=True the most recent active day is regenerated even if unchanged.
+    cache is passed to summarize_cached ("use", "refresh" or "off").
+    """
+    print(f"[{datetime.now()}] Generating daily changelog...")
+    cache_stats.update(hits=0, misses=0)
+    
+    state = load_state()
+    try:
+        new_count = ingest_new_commits(state)
+    except subprocess.CalledProcessError as e:
+        print(f"Error reading git history: {e}")
+        record_metric(errors=1)
+        return
+    print(f"Read {new_count} new commit(s).")
+    
+    days = days_to_regenerate(state, force)
+    if not days:
+        if any(record["commits"] for record in state["days"].values()):
+            print("No changes since the last run. Skipping.")
+        else:
+            print(f"No commits found in the last {MAX_DAYS_BACK} days. Skipping.")
+        save_state(state)
+        return
+    
+    for day in days:
+        record = state["days"][day]
+        target_date = datetime.strptime(day, "%Y-%m-%d")
+        print(f"Summarizing {len(record['commits'])} commit(s) on {target_date.strftime('%A, %Y-%m-%d')}.")
+        if write_changelog(target_date, record["commits"], cache):
+            record["summarized"] = sorted(c["sha"] for c in record["commits"])
+        save_state(state)
+    
+    if cache != "off":
+        evicted = evict_summary_cache()
+        print(f"Summary cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es)"
+              + (f", {evicted} old entr{'y' if evicted == 1 else 'ies'} evicted" if evicted else ""))
+
+@metered("backfill")
+def backfill(start_date, end_date, workers=BACKFILL_WORKERS, force=False, cache="use"):
+    """
+    Write a changelog for every day in [start_date, end_date] that had commits.
+    Commits come from one git pass over the range; summaries run on a pool of
+    `workers` threads, paced by the shared rate limiter. Days whose file exists and
+    was generated from the same commits are skipped unless force is set.
+    Returns the active days whose changelog file is now current.
+    """
+    print(f"[{datetime.now()}] Backfilling {start_date.date()} to {end_date.date()}...")
+    started = time.monotonic()
+    cache_stats.update(hits=0, misses=0)
+    state = load_state()
+    commits_by_day = get_commits_by_day(start_date, end_date + timedelta(days=1))
+    
+    todo, current = [], []
+    for day, commits in sorted(commits_by_day.items()):
+        shas = sorted(c["sha"] for c in commits)
+        record = state["days"].get(day.strftime("%Y-%m-%d"), {})
+        if not force and record.get("summarized") == shas and changelog_path(day).exists():
+            current.append(day)
+            continue
+        todo.append(day)
+    print(f"{len(commits_by_day)} active day(s), {len(commits_by_day) - len(todo)} already current.")
+    
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(write_changelog, day, commits_by_day[day], cache): day for day in todo}
+        for future in as_completed(futures):
+            day = futures[future]
+            commits = commits_by_day[day]
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"Error writing changelog for {day.date()}: {e}")
+                record_metric(errors=1)
+                ok = False
+            if ok:
+                state["days"][day.strftime("%Y-%m-%d")] = {
+                    "commits": commits,
+                    "summarized": sorted(c["sha"] for c in commits),
+                }
+                save_state(state)
+                current.append(day)
+            else:
+                failed += 1
+    
+    if cache != "off":
+        evict_summary_cache()
+    print(f"Backfill done in {time.monotonic() - started:.1f}s: {len(todo) - failed} written, "
+          f"{failed} failed, cache {cache_stats['hits']} hit(s) / {cache_stats['misses']} miss(es)")
+    return sorted(current)
+
+
+def rollup_period(kind, date):
+    """[start, end) of the week (Monday to Sunday) or calendar month containing date."""
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def rollup_path(kind, start):
+    """Output file for a rollup: changelog_week_YYYY-MM-DD.txt (its Monday) or changelog_month_YYYY-MM.txt."""
+    if kind == "week":
+        return CHANGELOG_FOLDER / f"changelog_week_{start.strftime('%Y-%m-%d')}.txt"
+    return CHANGELOG_FOLDER / f"changelog_month_{start.strftime('%Y-%m')}.txt"
+
+
+def read_daily_summary(target_date):
+    """The summary section of a day's changelog file, or None if missing or failed."""
+    try:
+        text = changelog_path(target_date).read_text()
+    except FileNotFoundError:
+        return None
+    summary = text.split("=" * 50, 1)[-1].rsplit("\n---\nGenerated:", 1)[0].strip()
+    return None if summary.startswith("Error") else summary
+
+
+def build_rollup_prompt(material, period_label, theme_line_start, source="the daily summaries"):
+    """Prompt turning daily summaries (or notes condensed from them) into a rollup."""
+    return f"""Here are {source} for {period_label} of work on a multiplayer dating game project called "Bad Date Demo":
+
+{material}
+
+Create a narrative summary of the whole period for a general (non-technical) audience. Format:
+
+1. **Theme line**: Start with "{theme_line_start}: [Theme]" - identify the overarching goal of the period
+
+2. **Theme description**: 2-3 sentences on what Sean was trying to accomplish and how the game moved forward.
+
+3. **Bulleted changes**: 5-10 bullets, each formatted as:
+   • **Short title** — Plain English explanation of what changed and why it matters to players
+
+Rules:
+- Write for someone who doesn't code - no technical jargon
+- Combine work that continued across several days into one bullet
+- Lead with the changes players will notice most
+- Be concise but descriptive
+
+Return the formatted summary."""
+
+
+def summarize_rollup(material, period_label, theme_line_start, output=None):
+    """Summarize daily summaries into a rollup, condensing them first if over budget."""
+    try:
+        if estimate_tokens(material) <= PROMPT_TOKEN_BUDGET:
+            prompt = build_rollup_prompt(material, period_label, theme_line_start)
+        else:
+            notes = condense(material.split("\n\n## "), period_label, source="the daily summaries")
+            prompt = build_rollup_prompt("\n".join(notes), period_label, theme_line_start,
+                                         source="notes condensed from the daily summaries")
+        return call_summarizer(prompt, output=output)
+    except Exception as e:
+        return f"Error generating summary: {e}"
+
+
+@metered("rollup")
+def generate_rollup(kind, date=None, workers=BACKFILL_WORKERS, cache="use"):
+    """
+    Write a weekly or monthly rollup for the period containing date (default yesterday),
+    composed from the daily summaries. Missing or stale days are generated first via
+    backfill; the rollup itself goes through the summary cache.
+    """
+    yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    start, end = rollup_period(kind, date or yesterday)
+    last_day = min(end - timedelta(days=1), yesterday)
+    days = backfill(start, last_day, workers, cache=cache) if last_day >= start else []
+    
+    sections = []
+    for day in days:
+        summary = read_daily_summary(day)
+        if summary:
+            sections.append(f"## {day.strftime('%A, %B %d')}\n{summary}")
+    if not sections:
+        print(f"No daily summaries for the {kind} starting {start.date()}. Skipping.")
+        return
+    
+    if kind == "week":
+        period_label = f"the week of {start.strftime('%B %d, %Y')}"
+        theme_line_start = "The Week's Focus"
+        title = f"Week of {start.strftime('%B %d, %Y')}"
+    else:
+        period_label = start.strftime("%B %Y")
+        theme_line_start = f"{start.strftime('%B')}'s Focus"
+        title = start.strftime("%B %Y")
+    material = "\n\n".join(sections)
+    header = f"""Bad Date Demo - {'Weekly' if kind == 'week' else 'Monthly'} Summary
+{title} ({len(sections)} active day{'s' if len(sections) != 1 else ''})
+{'=' * 50}
+
+"""
+    filepath = rollup_path(kind, start)
+    stream = StreamingOutput(filepath, header) if STREAM_OUTPUT else None
+    summary = cached_summary(
+        ("rollup", kind, material, period_label, theme_line_start),
+        lambda: summarize_rollup(material, period_label, theme_line_start, stream),
+        cache,
+    )
+    if summary.startswith("Error"):
+        record_metric(errors=1)
+    
+    footer = f"""
+
+---
+Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+"""
+    with timed("write"):
+        if stream is not None:
+            stream.finish(summary, footer)
+        else:
+            with open(filepath, "w") as f:
+                f.write(header + summary + footer)
+    print(f"Rollup saved to: {filepath}")
+
+
+def next_run_after(moment):
+    """The first scheduled run time (a weekday at RUN_HOUR:RUN_MINUTE) strictly after moment."""
+    candidate = moment.replace(hour=RUN_HOUR, minute=RUN_MINUTE, second=0, microsecond=0)
+    if candidate <= moment:
+        candidate += timedelta(days=1)
+    while candidate.weekday() not in RUN_WEEKDAYS:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def load_last_run():
+    """When the scheduler last ran generate_changelog, or None if it never has."""
+    try:
+        with open(SCHEDULER_FILE) as f:
+            return datetime.fromisoformat(json.load(f)["last_run"])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+        return None
+
+
+def save_last_run(moment):
+    """Persist the scheduler's last run time to SCHEDULER_FILE."""
+    CHANGELOG_FOLDER.mkdir(exist_ok=True)
+    tmp_path = SCHEDULER_FILE.with_name(SCHEDULER_FILE.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"last_run": moment.isoformat(timespec="seconds")}, f)
+    os.replace(tmp_path, SCHEDULER_FILE)
+
+
+def acquire_scheduler_lock():
+    """
+    Take an exclusive lock on SCHEDULER_LOCK for the life of the process.
+    Returns the open lock file, or None if another scheduler holds it.
+    """
+    CHANGELOG_FOLDER.mkdir(exist_ok=True)
+    lock_file = open(SCHEDULER_LOCK, "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.seek(0)
+        holder = lock_file.read().strip()
+        lock_file.close()
+        print(f"Another scheduler is already running{f' (pid {holder})' if holder else ''}. Exiting.")
+        return None
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
 
 def run_scheduler():
-    """Run the scheduler for weekday 10am execution."""
-    # Schedule for weekdays at 10am
-    schedule.every().monday.at("10:00").do(generate_changelog)
-    schedule.every().tuesday.at("10:00").do(generate_changelog)
-    schedule.every().wednesday.at("10:00").do(generate_changelog)
-    schedule.every().thursday.at("10:00").do(generate_changelog)
-    schedule.every().friday.at("10:00").do(generate_changelog)
+    """
+    Run generate_changelog every weekday at 10am, sleeping until each run is due.
+    Runs missed since the last recorded one are caught up with a single run at startup
+    (or on wake), since each run regenerates every day whose commits changed.
+    SIGINT/SIGTERM stop the scheduler cleanly between runs.
+    """
+    lock_file = acquire_scheduler_lock()
+    if lock_file is None:
+        return
+    
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        print("\nStopping scheduler...")
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    last_run = load_last_run()
+    due = next_run_after(last_run or datetime.now())
     
     print("Daily Changelog Generator started!")
     print("Scheduled to run every weekday at 10:00 AM")
     print("Press Ctrl+C to stop.\n")
     
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
+    try:
+        while not stop.is_set():
+            now = datetime.now()
+            if now < due:
+                print(f"Next run at {due.strftime('%A %Y-%m-%d %H:%M')}.")
+                while not stop.is_set() and datetime.now() < due:
+                    stop.wait(min((due - datetime.now()).total_seconds(), SCHEDULER_MAX_SLEEP))
+                continue
+            
+            missed, moment = 0, due
+            while moment <= now:
+                missed += 1
+                moment = next_run_after(moment)
+            if missed > 1 or now - due > timedelta(minutes=SCHEDULER_MAX_SLEEP // 60 + 1):
+                print(f"Catching up {missed} missed run(s) since {due.strftime('%A %Y-%m-%d %H:%M')}.")
+            try:
+                generate_changelog()
+            except Exception as e:
+                print(f"Scheduled run failed: {e}")
+            save_last_run(now)
+            due = next_run_after(now)
+    finally:
+        lock_file.close()
+    print("Scheduler stopped.")
+
+def parse_date_arg(name, default=None):
+    """Value of a --name=YYYY-MM-DD argument as a datetime (default if absent)."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return datetime.strptime(arg.split("=", 1)[1], "%Y-%m-%d")
+    return default
+
 
 if __name__ == "__main__":
-    import sys
+    check_token_budget()
+    if "--no-cache" in sys.argv:
+        cache = "off"
+    elif "--refresh" in sys.argv:
+        cache = "refresh"
+    else:
+        cache = "use"
+    
+    if "--stream" in sys.argv:
+        STREAM_OUTPUT = True
     
-    if len(sys.argv) > 1 and sys.argv[1] == "--now":
+    if "--report" in sys.argv:
+        report_metrics()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--now":
         # Run immediately for testing
         print("Running changelog generation now (test mode)...")
-        generate_changelog()
+        generate_changelog(force="--force" in sys.argv, cache=cache)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--backfill":
+        yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        start_date = parse_date_arg("from")
+        if start_date is None:
+            print("Usage: daily_changelog.py --backfill --from=YYYY-MM-DD [--to=YYYY-MM-DD] "
+                  "[--workers=N] [--force] [--no-cache|--refresh]")
+            sys.exit(1)
+        workers = next((int(a.split("=", 1)[1]) for a in sys.argv if a.startswith("--workers=")), BACKFILL_WORKERS)
+        backfill(start_date, parse_date_arg("to", yesterday), workers, "--force" in sys.argv, cache)
+    elif any(arg.startswith("--rollup=") for arg in sys.argv):
+        kind = next(a.split("=", 1)[1] for a in sys.argv if a.startswith("--rollup="))
+        if kind not in ("week", "month"):
+            print("Usage: daily_changelog.py --rollup=week|month [--date=YYYY-MM-DD] [--no-cache|--refresh]")
+            sys.exit(1)
+        generate_rollup(kind, parse_date_arg("date"), cache=cache)
     else:
         # Run the scheduler
         run_scheduler()